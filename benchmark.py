@@ -0,0 +1,556 @@
+import os
+import sys
+import argparse
+import json
+import math
+import time
+import torch
+import torch.nn.functional as F
+from torch.utils.data import default_collate
+from einops import rearrange
+
+from utils import set_device, load_checkpoint
+from utils.profiling import ModuleTimer
+from utils.metrics import psnr as psnr_batch, downsampled_ssim
+from datasets.loader import PairLoader, batch_augment, merge_patches
+from datasets.packed import PackedPairLoader
+from models import *
+from models.spectral import patch_fft_correlation, patch_fft_gating
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--device', default='cpu', type=str, help='device used for benchmarking (cuda or cpu)')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+parser.add_argument('--warmup', default=3, type=int, help='untimed iterations')
+parser.add_argument('--iters', default=10, type=int, help='timed iterations')
+subparsers = parser.add_subparsers(dest='command', required=True)
+
+parser_spectral = subparsers.add_parser('spectral', help='check and time the patch FFT ops against the einops code')
+parser_spectral.add_argument('--size', default=256, type=int, help='feature map size')
+parser_spectral.add_argument('--dim', default=48, type=int, help='embedding dim of the block')
+parser_spectral.add_argument('--num_heads', default=2, type=int, help='attention heads of the block')
+parser_spectral.add_argument('--mlp_ratio', default=2.66, type=float, help='mlp ratio of the block')
+
+parser_amp = subparsers.add_parser('amp', help='accuracy and throughput of autocast against fp32')
+parser_amp.add_argument('--models', default='msrformer-s,msrformer-l', type=str, help='comma separated model names')
+parser_amp.add_argument('--dtypes', default='bfloat16', type=str, help='comma separated autocast dtypes')
+parser_amp.add_argument('--size', default=256, type=int, help='input size')
+parser_amp.add_argument('--batch_size', default=1, type=int, help='batch size')
+parser_amp.add_argument('--num_images', default=8, type=int, help='number of test images (or random inputs)')
+parser_amp.add_argument('--save_dir', default='saved_models/', type=str, help='trained models, random weights if missing')
+parser_amp.add_argument('--exp', default='indoor', type=str, help='experiment setting')
+parser_amp.add_argument('--data_dir', default='', type=str, help='path to dataset, random inputs if empty')
+parser_amp.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
+
+parser_loader = subparsers.add_parser('loader', help='per-sample cost of the training data pipeline')
+parser_loader.add_argument('--data_dir', default='data/', type=str, help='path to dataset')
+parser_loader.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
+parser_loader.add_argument('--sub_dir', default='train', type=str, help='split to read')
+parser_loader.add_argument('--backends', default='png,packed', type=str, help='comma separated data backends')
+parser_loader.add_argument('--pipelines', default='float,uint8', type=str, help='comma separated sample formats')
+parser_loader.add_argument('--batch_size', default=16, type=int, help='batch size for the tensor-side augmentation')
+parser_loader.add_argument('--patches_per_image', default=1, type=int, help='crops per decoded image')
+parser_loader.add_argument('--size', default=256, type=int, help='crop size')
+parser_loader.add_argument('--num_samples', default=200, type=int, help='number of samples to read')
+
+parser_ckpt = subparsers.add_parser('checkpoint', help='memory and time of a train step with activation checkpointing')
+parser_ckpt.add_argument('--models', default='msrformer-s,msrformer-l', type=str, help='comma separated model names')
+parser_ckpt.add_argument('--plans', default='none,layer1,layer2,layer3,layer4,layer5,all', type=str,
+						 help='comma separated stages to checkpoint fully, none or all')
+parser_ckpt.add_argument('--size', default=256, type=int, help='patch size')
+parser_ckpt.add_argument('--batch_size', default=1, type=int, help='batch size')
+
+parser_model = subparsers.add_parser('model', help='latency, throughput and memory per stage over resolutions and batch sizes')
+parser_model.add_argument('--models', default='msrformer-s,msrformer-l', type=str, help='comma separated model names')
+parser_model.add_argument('--sizes', default='256,512,1024,2048', type=str, help='comma separated input sizes')
+parser_model.add_argument('--batch_sizes', default='1,4', type=str, help='comma separated batch sizes')
+parser_model.add_argument('--modes', default='eval,train', type=str, help='eval (forward) and/or train (forward+backward)')
+parser_model.add_argument('--output', default='', type=str, help='json file for the results')
+
+parser_compare = subparsers.add_parser('compare', help='flag regressions between two json results of the model command')
+parser_compare.add_argument('baseline', type=str, help='json results of the baseline')
+parser_compare.add_argument('current', type=str, help='json results to check')
+parser_compare.add_argument('--threshold', default=0.05, type=float, help='relative increase reported as a regression')
+
+parser_lowres = subparsers.add_parser('lowres', help='PSNR/SSIM and latency of low resolution inference with guided upsampling')
+parser_lowres.add_argument('--models', default='msrformer-s,msrformer-l', type=str, help='comma separated model names')
+parser_lowres.add_argument('--scales', default='1,2,4', type=str, help='comma separated downscale factors, 1 is the full model')
+parser_lowres.add_argument('--gf_radius', default=2, type=int, help='guided filter radius')
+parser_lowres.add_argument('--gf_eps', default=1e-3, type=float, help='guided filter regularization')
+parser_lowres.add_argument('--num_images', default=50, type=int, help='number of test images')
+parser_lowres.add_argument('--save_dir', default='saved_models/', type=str, help='trained models, random weights if missing')
+parser_lowres.add_argument('--exp', default='indoor', type=str, help='experiment setting')
+parser_lowres.add_argument('--data_dir', default='data/', type=str, help='path to dataset')
+parser_lowres.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
+
+parser_layout = subparsers.add_parser('layout', help='latency and allocations of channels_last against contiguous NCHW')
+parser_layout.add_argument('--models', default='msrformer-s,msrformer-l', type=str, help='comma separated model names')
+parser_layout.add_argument('--size', default=512, type=int, help='input size')
+parser_layout.add_argument('--batch_size', default=1, type=int, help='batch size')
+parser_layout.add_argument('--modes', default='eval,train', type=str, help='eval (forward) and/or train (forward+backward)')
+
+args = parser.parse_args()
+
+device = set_device(args.device, args.num_threads)
+
+
+def measure(fn):
+	# latency in ms, peak memory in MB (cuda only) and memory kept for backward in MB
+	for _ in range(args.warmup):
+		fn()
+
+	saved = [0]
+	def pack(t):
+		saved[0] += t.numel() * t.element_size()
+		return t
+
+	if device.type == 'cuda':
+		torch.cuda.synchronize()
+		torch.cuda.reset_peak_memory_stats()
+	base = torch.cuda.memory_allocated() if device.type == 'cuda' else 0
+
+	start = time.perf_counter()
+	for i in range(args.iters):
+		if i == 0:
+			with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+				fn()
+		else:
+			fn()
+	if device.type == 'cuda':
+		torch.cuda.synchronize()
+	latency = (time.perf_counter() - start) / args.iters * 1000
+
+	peak = (torch.cuda.max_memory_allocated() - base) / 2**20 if device.type == 'cuda' else float('nan')
+	return {'latency': latency, 'peak': peak, 'saved': saved[0] / 2**20}
+
+
+def report(name, stats):
+	print('{0:<28s} {1:>10.03f} ms {2:>10.01f} MB peak {3:>10.01f} MB saved'
+		  .format(name, stats['latency'], stats['peak'], stats['saved']))
+
+
+def correlation_reference(q, k, patch_size):
+	q_patch = rearrange(q, 'a b (c patch1 patch2) d -> a b c d patch1 patch2', patch1=patch_size,
+						patch2=patch_size)
+	k_patch = rearrange(k, 'a b (c patch1 patch2) d -> a b c d patch1 patch2', patch1=patch_size,
+						patch2=patch_size)
+	q_fft = torch.fft.rfft2(q_patch.float())
+	k_fft = torch.fft.rfft2(k_patch.float())
+	out = q_fft * k_fft
+	out = torch.fft.irfft2(out, s=(patch_size, patch_size))
+	out = rearrange(out, 'a b c d patch1 patch2 -> a b (c patch1 patch2) d' , patch1=patch_size,
+						patch2=patch_size)
+	return out
+
+
+def gating_reference(x, weight, patch_size):
+	x_patch = rearrange(x, 'b c (h patch1) (w patch2) -> b c h w patch1 patch2', patch1=patch_size,
+						patch2=patch_size)
+	x_patch_fft = torch.fft.rfft2(x_patch.float())
+	x_patch_fft = x_patch_fft * weight
+	x_patch = torch.fft.irfft2(x_patch_fft, s=(patch_size, patch_size))
+	x = rearrange(x_patch, 'b c h w patch1 patch2 -> b c (h patch1) (w patch2)', patch1=patch_size,
+				  patch2=patch_size)
+	return x
+
+
+def check(name, reference, op, leaves, split, patch_size):
+	# inputs are built from the leaves by split(), so strided views reach the ops as in the model
+	leaves_ref = [t.detach().clone().requires_grad_() for t in leaves]
+	leaves_op = [t.detach().clone().requires_grad_() for t in leaves]
+
+	out_ref = reference(*split(*leaves_ref), patch_size)
+	out_op = op(*split(*leaves_op), patch_size)
+	grad = torch.randn_like(out_ref)
+	out_ref.backward(grad)
+	out_op.backward(grad)
+
+	errors = [(out_ref - out_op).abs().max().item()]
+	errors += [(a.grad - b.grad).abs().max().item() for a, b in zip(leaves_ref, leaves_op)]
+	print('{0:<28s} forward err {1:.2e}, grad err {2}'
+		  .format(name, errors[0], ', '.join('%.2e' % e for e in errors[1:])))
+
+	def step(fn, leaves):
+		def run():
+			out = fn(*split(*leaves), patch_size)
+			out.backward(grad)
+		return run
+
+	report(name + ' (einops)', measure(step(reference, leaves_ref)))
+	report(name + ' (spectral)', measure(step(op, leaves_op)))
+
+
+def bench_spectral():
+	patch_size = 8
+	size, dim = args.size, args.dim
+
+	# q and k of WindowAttention are strided views of the qkv windows
+	num_windows = (size // patch_size) ** 2
+	qkv = torch.randn(num_windows, patch_size ** 2, 3, args.num_heads, dim // args.num_heads, device=device)
+	split_qkv = lambda qkv: (qkv.permute(2, 0, 3, 1, 4)[0], qkv.permute(2, 0, 3, 1, 4)[1])
+	check('WindowAttention q*k', correlation_reference, patch_fft_correlation, [qkv], split_qkv, patch_size)
+
+	hidden = int(dim * args.mlp_ratio) * 2
+	x = torch.randn(1, hidden, size, size, device=device)
+	weight = torch.randn(hidden, 1, 1, patch_size, patch_size // 2 + 1, device=device)
+	check('DFFN fft gating', gating_reference, patch_fft_gating, [x, weight], lambda x, w: (x, w), patch_size)
+
+
+def build_network(name):
+	network = eval(name.replace('-', '_'))()
+	saved_model_dir = os.path.join(args.save_dir, args.exp, name+'.pth')
+	if os.path.exists(saved_model_dir):
+		load_checkpoint(network, saved_model_dir)
+	else:
+		print('==> No trained {0}, using random weights'.format(name))
+	return network.to(device)
+
+
+def load_batches(batch_size, num_images, size):
+	# [-1, 1] inputs and targets, targets are None for random inputs
+	if args.data_dir:
+		dataset = PairLoader(os.path.join(args.data_dir, args.dataset), 'test', 'valid', size)
+		samples = [dataset[i] for i in range(min(num_images, len(dataset)))]
+		sources = torch.stack([torch.from_numpy(sample['source']) for sample in samples])
+		targets = torch.stack([torch.from_numpy(sample['target']) for sample in samples])
+	else:
+		sources = torch.rand(num_images, 3, size, size) * 2 - 1
+		targets = None
+
+	batches = []
+	for i in range(0, sources.shape[0], batch_size):
+		target = targets[i:i+batch_size].to(device) if targets is not None else None
+		batches.append((sources[i:i+batch_size].to(device), target))
+	return batches
+
+
+def psnr(output, target):
+	mse = F.mse_loss(output.float().clamp(-1, 1) * 0.5 + 0.5, target.float() * 0.5 + 0.5).item()
+	return 10 * math.log10(1 / mse) if mse > 0 else float('inf')
+
+
+def bench_amp():
+	batches = load_batches(args.batch_size, args.num_images, args.size)
+
+	print('{0:<14s} {1:<10s} {2:>12s} {3:>12s} {4:>14s} {5:>12s}'
+		  .format('model', 'dtype', 'eval img/s', 'train img/s', 'PSNR vs fp32', 'PSNR vs GT'))
+	for name in args.models.split(','):
+		network = build_network(name)
+
+		reference = None
+		for dtype_name in ['float32'] + args.dtypes.split(','):
+			dtype = getattr(torch, dtype_name)
+			enabled = dtype != torch.float32
+
+			network.eval()
+			with torch.no_grad(), torch.autocast(device.type, dtype=dtype, enabled=enabled):
+				outputs = [network(source) for source, _ in batches]
+				eval_stats = measure(lambda: network(batches[0][0]))
+
+			network.train()
+			def train_step():
+				with torch.autocast(device.type, dtype=dtype, enabled=enabled):
+					loss = network(batches[0][0]).float().abs().mean()
+				loss.backward()
+			train_stats = measure(train_step)
+			network.zero_grad(set_to_none=True)
+
+			if reference is None:
+				reference = outputs
+			vs_fp32 = sum(psnr(o, r) for o, r in zip(outputs, reference)) / len(outputs)
+			vs_gt = sum(psnr(o, t) for o, (_, t) in zip(outputs, batches)) / len(outputs) if args.data_dir else float('nan')
+
+			batch_size = batches[0][0].shape[0]
+			print('{0:<14s} {1:<10s} {2:>12.02f} {3:>12.02f} {4:>14.02f} {5:>12.02f}'
+				  .format(name, dtype_name, batch_size / eval_stats['latency'] * 1000,
+						  batch_size / train_stats['latency'] * 1000, vs_fp32, vs_gt))
+
+
+def bench_loader():
+	# a sample is one crop, bytes/sample is what a worker sends to the main process,
+	# batch ms/sample is the main-process augmentation of the uint8 pipeline
+	dataset_dir = os.path.join(args.data_dir, args.dataset)
+
+	print('{0:<10s} {1:<10s} {2:>12s} {3:>16s} {4:>14s} {5:>16s}'
+		  .format('backend', 'pipeline', 'samples/s', 'cpu ms/sample', 'bytes/sample', 'batch ms/sample'))
+	for backend in args.backends.split(','):
+		for pipeline in args.pipelines.split(','):
+			Loader = PackedPairLoader if backend == 'packed' else PairLoader
+			dataset = Loader(dataset_dir, args.sub_dir, 'train', args.size, uint8=pipeline == 'uint8',
+							 patches_per_image=args.patches_per_image)
+			num_images = min(args.num_samples // args.patches_per_image, len(dataset))
+			num_samples = num_images * args.patches_per_image
+
+			samples = []
+			start, cpu_start = time.perf_counter(), time.process_time()
+			for idx in range(num_images):
+				samples.append(dataset[idx])
+			elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+			transfer = sum(samples[0][key].nbytes for key in ['source', 'target']) // args.patches_per_image
+
+			batch_time = float('nan')
+			if pipeline == 'uint8':
+				batch = merge_patches(default_collate(samples[:max(1, args.batch_size // args.patches_per_image)]))
+				batch_time = measure(lambda: batch_augment(batch, device))['latency'] / batch['source'].shape[0]
+
+			print('{0:<10s} {1:<10s} {2:>12.01f} {3:>16.03f} {4:>14d} {5:>16.03f}'
+				  .format(backend, pipeline, num_samples / elapsed, cpu / num_samples * 1000, transfer, batch_time))
+
+
+def bench_checkpoint():
+	# peak is measured on cuda only, saved counts the tensors kept outside the checkpointed blocks
+	layers = ['layer1', 'layer2', 'layer3', 'layer4', 'layer5']
+	source = torch.rand(args.batch_size, 3, args.size, args.size, device=device) * 2 - 1
+
+	print('{0:<14s} {1:<8s} {2:>12s} {3:>12s} {4:>12s} {5:>12s}'
+		  .format('model', 'plan', 'step ms', 'recompute', 'peak MB', 'saved MB'))
+	for name in args.models.split(','):
+		network = eval(name.replace('-', '_'))().to(device)
+		network.train()
+
+		def train_step():
+			network(source).abs().mean().backward()
+
+		baseline = None
+		for plan in args.plans.split(','):
+			network.set_checkpointing([1 << 30 if plan in ['all', layer] else 0 for layer in layers])
+			stats = measure(train_step)
+			network.zero_grad(set_to_none=True)
+
+			if baseline is None:
+				baseline = stats
+			print('{0:<14s} {1:<8s} {2:>12.02f} {3:>11.01f}% {4:>12.01f} {5:>12.01f}'
+				  .format(name, plan, stats['latency'], (stats['latency'] / baseline['latency'] - 1) * 100,
+						  stats['peak'], stats['saved']))
+
+
+STAGES = ['patch_embed', 'layer1', 'patch_merge1', 'layer2', 'patch_merge2', 'layer3', 'patch_split1', 'fusion1',
+		  'layer4', 'patch_split2', 'fusion2', 'layer5', 'patch_unembed']
+
+
+def bench_model_config(network, mode, size, batch_size):
+	source = torch.rand(batch_size, 3, size, size, device=device) * 2 - 1
+
+	if mode == 'train':
+		network.train()
+		def step():
+			network(source).abs().mean().backward()
+	else:
+		network.eval()
+		def step():
+			with torch.no_grad():
+				network(source)
+
+	stats = measure(step)
+
+	# a separate pass with hooks, syncing at every stage boundary would skew the total
+	timer = ModuleTimer([(name, getattr(network, name)) for name in STAGES], sync=True, track_memory=True)
+	try:
+		with torch.autograd.graph.saved_tensors_hooks(timer.pack, lambda t: t):
+			step()
+		timer.reset()
+		for _ in range(args.iters):
+			with torch.autograd.graph.saved_tensors_hooks(timer.pack, lambda t: t):
+				step()
+	finally:
+		timer.close()		# hooks left behind after an OOM would skew the next configs
+	network.zero_grad(set_to_none=True)
+
+	stages = {name: {'forward_ms': timer.forward[name] / args.iters * 1000,
+					 'backward_ms': timer.backward[name] / args.iters * 1000 if mode == 'train' else 0.,
+					 'peak_mb': timer.peak[name] / 2**20 if device.type == 'cuda' else float('nan'),
+					 'saved_mb': timer.saved[name] / args.iters / 2**20} for name in STAGES}
+
+	return {'latency_ms': stats['latency'], 'throughput': batch_size / stats['latency'] * 1000,
+			'peak_mb': stats['peak'], 'saved_mb': stats['saved'], 'stages': stages}
+
+
+def bench_model():
+	results = []
+	for name in args.models.split(','):
+		network = eval(name.replace('-', '_'))().to(device)
+		for mode in args.modes.split(','):
+			for size in [int(v) for v in args.sizes.split(',')]:
+				for batch_size in [int(v) for v in args.batch_sizes.split(',')]:
+					result = {'model': name, 'mode': mode, 'size': size, 'batch_size': batch_size}
+					try:
+						result.update(bench_model_config(network, mode, size, batch_size))
+					except RuntimeError as e:
+						if 'out of memory' not in str(e):
+							raise
+						network.zero_grad(set_to_none=True)
+						if device.type == 'cuda':
+							torch.cuda.empty_cache()
+						result['error'] = 'out of memory'
+						print('{0:<14s} {1:<6s} {2:>5d} x{3:<3d} out of memory'.format(name, mode, size, batch_size))
+						results.append(result)
+						continue
+
+					print('{0:<14s} {1:<6s} {2:>5d} x{3:<3d} {4:>10.02f} ms {5:>8.02f} img/s {6:>10.01f} MB peak {7:>10.01f} MB saved'
+						  .format(name, mode, size, batch_size, result['latency_ms'], result['throughput'],
+								  result['peak_mb'], result['saved_mb']))
+					for stage, stage_stats in result['stages'].items():
+						print('    {0:<14s} {1:>10.02f} ms fwd {2:>10.02f} ms bwd {3:>10.01f} MB peak {4:>10.01f} MB saved'
+							  .format(stage, stage_stats['forward_ms'], stage_stats['backward_ms'],
+									  stage_stats['peak_mb'], stage_stats['saved_mb']))
+					results.append(result)
+
+	if args.output:
+		# nan (no peak memory on cpu) is written as null
+		info = {'device': str(device), 'torch': torch.__version__, 'num_threads': torch.get_num_threads(),
+				'warmup': args.warmup, 'iters': args.iters}
+		with open(args.output, 'w') as f:
+			json.dump(to_json({'info': info, 'results': results}), f, indent=2)
+		print('==> Saved ' + args.output)
+
+
+def to_json(obj):
+	if isinstance(obj, float) and math.isnan(obj):
+		return None
+	if isinstance(obj, dict):
+		return {k: to_json(v) for k, v in obj.items()}
+	if isinstance(obj, list):
+		return [to_json(v) for v in obj]
+	return obj
+
+
+def bench_compare():
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	with open(args.current) as f:
+		current = json.load(f)
+
+	key = lambda r: (r['model'], r['mode'], r['size'], r['batch_size'])
+	baseline_results = {key(r): r for r in baseline['results']}
+
+	regressions = 0
+	print('{0:<14s} {1:<6s} {2:>5s} {3:>4s} {4:>12s} {5:>12s} {6:>10s}'
+		  .format('model', 'mode', 'size', 'bs', 'metric', 'baseline', 'change'))
+	for result in current['results']:
+		base = baseline_results.get(key(result))
+		if base is None:
+			continue
+		for metric in ['latency_ms', 'peak_mb', 'saved_mb']:
+			old, new = base.get(metric), result.get(metric)
+			if old is None or new is None or old == 0:
+				continue
+			change = new / old - 1
+			flag = 'REGRESSION' if change > args.threshold else ''
+			regressions += flag != ''
+			print('{0:<14s} {1:<6s} {2:>5d} {3:>4d} {4:>12s} {5:>12.02f} {6:>+9.01f}% {7}'
+				  .format(result['model'], result['mode'], result['size'], result['batch_size'], metric, old,
+						  change * 100, flag))
+
+	print('==> {0} regressions above {1:.0f}%'.format(regressions, args.threshold * 100))
+	return regressions
+
+
+def bench_lowres():
+	# full test images, one at a time as in test.py
+	dataset = PairLoader(os.path.join(args.data_dir, args.dataset), 'test', 'test')
+	samples = [dataset[i] for i in range(min(args.num_images, len(dataset)))]
+
+	print('{0:<14s} {1:>6s} {2:>8s} {3:>8s} {4:>12s} {5:>8s}'.format('model', 'scale', 'PSNR', 'SSIM', 'ms/img', 'speedup'))
+	for name in args.models.split(','):
+		network = build_network(name).eval()
+
+		baseline = None
+		for scale in [float(v) for v in args.scales.split(',')]:
+			with torch.no_grad():
+				for _ in range(args.warmup):
+					network.forward_lowres(torch.from_numpy(samples[0]['source'])[None].to(device), scale,
+										   args.gf_radius, args.gf_eps)
+
+			PSNR, SSIM, elapsed = 0., 0., 0.
+			for sample in samples:
+				source = torch.from_numpy(sample['source'])[None].to(device)
+				target = torch.from_numpy(sample['target'])[None].to(device) * 0.5 + 0.5
+
+				with torch.no_grad():
+					start = time.perf_counter()
+					output = network.forward_lowres(source, scale, args.gf_radius, args.gf_eps).clamp_(-1, 1) * 0.5 + 0.5
+					if device.type == 'cuda':
+						torch.cuda.synchronize()
+					elapsed += time.perf_counter() - start
+
+				PSNR += psnr_batch(output, target).item()
+				SSIM += downsampled_ssim(output, target).item()
+
+			latency = elapsed / len(samples) * 1000
+			baseline = baseline or latency
+			print('{0:<14s} {1:>6.02f} {2:>8.02f} {3:>8.04f} {4:>12.01f} {5:>7.02f}x'
+				  .format(name, scale, PSNR / len(samples), SSIM / len(samples), latency, baseline / latency))
+
+
+def count_allocations(step):
+	# tensors allocated and aten::copy_ calls (layout conversions among them) of one step
+	activities = [torch.profiler.ProfilerActivity.CPU]
+	if device.type == 'cuda':
+		activities.append(torch.profiler.ProfilerActivity.CUDA)
+		torch.cuda.synchronize()
+		before = torch.cuda.memory_stats()
+
+	with torch.profiler.profile(activities=activities) as prof:
+		step()
+
+	ops = {e.key: e.count for e in prof.key_averages()}
+	if device.type == 'cuda':
+		torch.cuda.synchronize()
+		after = torch.cuda.memory_stats()
+		allocs = after['allocation.all.allocated'] - before['allocation.all.allocated']
+		alloc_mb = (after['allocated_bytes.all.allocated'] - before['allocated_bytes.all.allocated']) / 2**20
+	else:
+		# cpu has no allocator stats, the allocating factory ops are counted instead
+		allocs = sum(ops.get(op, 0) for op in ['aten::empty', 'aten::empty_strided', 'aten::empty_like'])
+		alloc_mb = float('nan')
+	return allocs, alloc_mb, ops.get('aten::copy_', 0)
+
+
+def bench_layout():
+	source = torch.rand(args.batch_size, 3, args.size, args.size, device=device) * 2 - 1
+
+	print('{0:<14s} {1:<6s} {2:<14s} {3:>10s} {4:>8s} {5:>10s} {6:>10s} {7:>10s}'
+		  .format('model', 'mode', 'layout', 'ms', 'speedup', 'allocs', 'alloc MB', 'copies'))
+	for name in args.models.split(','):
+		for mode in args.modes.split(','):
+			baseline = None
+			for layout in ['contiguous', 'channels_last']:
+				network = eval(name.replace('-', '_'))().to(device)
+				if layout == 'channels_last':
+					network.to_channels_last()
+
+				if mode == 'train':
+					network.train()
+					def step():
+						network(source).abs().mean().backward()
+				else:
+					network.eval()
+					def step():
+						with torch.no_grad():
+							network(source)
+
+				stats = measure(step)
+				allocs, alloc_mb, copies = count_allocations(step)
+				baseline = baseline or stats['latency']
+				print('{0:<14s} {1:<6s} {2:<14s} {3:>10.02f} {4:>7.02f}x {5:>10d} {6:>10.01f} {7:>10d}'
+					  .format(name, mode, layout, stats['latency'], baseline / stats['latency'], allocs, alloc_mb, copies))
+
+
+if __name__ == '__main__':
+	if args.command == 'spectral':
+		bench_spectral()
+	elif args.command == 'amp':
+		bench_amp()
+	elif args.command == 'loader':
+		bench_loader()
+	elif args.command == 'checkpoint':
+		bench_checkpoint()
+	elif args.command == 'model':
+		bench_model()
+	elif args.command == 'lowres':
+		bench_lowres()
+	elif args.command == 'layout':
+		bench_layout()
+	elif args.command == 'compare':
+		sys.exit(1 if bench_compare() > 0 else 0)
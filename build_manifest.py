@@ -0,0 +1,21 @@
+import os
+import argparse
+
+from datasets.manifest import build_manifest
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--data_dir', default='data/', type=str, help='path to dataset')
+parser.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
+parser.add_argument('--sub_dirs', default='train,test', type=str, help='comma separated splits to index')
+args = parser.parse_args()
+
+
+if __name__ == '__main__':
+	for sub_dir in args.sub_dirs.split(','):
+		root_dir = os.path.join(args.data_dir, args.dataset, sub_dir)
+		manifest = build_manifest(root_dir)
+		print('==> Indexed {0} pairs in {1}'.format(len(manifest), root_dir))
+
+		for img_name in manifest.get_mismatched():
+			print('hazy and GT shapes differ: ' + img_name)
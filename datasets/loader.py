@@ -1,107 +1,232 @@
-import os
-import random
-import numpy as np
-import cv2
-
-from torch.utils.data import Dataset
-from utils import hwc_to_chw, read_img
-
-
-def augment(imgs=[], size=256, edge_decay=0., only_h_flip=False):
-	H, W, _ = imgs[0].shape
-	Hc, Wc = [size, size]
-
-	# simple re-weight for the edge
-	if random.random() < Hc / H * edge_decay:
-		Hs = 0 if random.randint(0, 1) == 0 else H - Hc
-	else:
-		Hs = random.randint(0, H-Hc)
-
-	if random.random() < Wc / W * edge_decay:
-		Ws = 0 if random.randint(0, 1) == 0 else W - Wc
-	else:
-		Ws = random.randint(0, W-Wc)
-
-	for i in range(len(imgs)):
-		imgs[i] = imgs[i][Hs:(Hs+Hc), Ws:(Ws+Wc), :]
-
-	# horizontal flip
-	if random.randint(0, 1) == 1:
-		for i in range(len(imgs)):
-			imgs[i] = np.flip(imgs[i], axis=1)
-
-	if not only_h_flip:
-		# bad data augmentations for outdoor
-		rot_deg = random.randint(0, 3)
-		for i in range(len(imgs)):
-			imgs[i] = np.rot90(imgs[i], rot_deg, (0, 1))
-			
-	return imgs
-
-
-def align(imgs=[], size=256):
-	H, W, _ = imgs[0].shape
-	Hc, Wc = [size, size]
-
-	Hs = (H - Hc) // 2
-	Ws = (W - Wc) // 2
-	for i in range(len(imgs)):
-		imgs[i] = imgs[i][Hs:(Hs+Hc), Ws:(Ws+Wc), :]
-
-	return imgs
-
-
-class PairLoader(Dataset):
-	def __init__(self, data_dir, sub_dir, mode, size=256, edge_decay=0, only_h_flip=False):
-		assert mode in ['train', 'valid', 'test']
-
-		self.mode = mode
-		self.size = size
-		self.edge_decay = edge_decay
-		self.only_h_flip = only_h_flip
-
-		self.root_dir = os.path.join(data_dir, sub_dir) # data/RESIDE-IN/train
-		self.img_names = sorted(os.listdir(os.path.join(self.root_dir, 'GT')))
-		self.img_num = len(self.img_names)
-
-	def __len__(self):
-		return self.img_num
-
-	def __getitem__(self, idx):
-		cv2.setNumThreads(0)
-		cv2.ocl.setUseOpenCL(False)
-		# print(self.img_names)
-
-		# read image, and scale [0, 1] to [-1, 1]
-		img_name = self.img_names[idx]
-		source_img = read_img(os.path.join(self.root_dir, 'hazy', img_name)) * 2 - 1
-		target_img = read_img(os.path.join(self.root_dir, 'GT', img_name)) * 2 - 1
-
-		
-		if self.mode == 'train':
-			[source_img, target_img] = augment([source_img, target_img], self.size, self.edge_decay, self.only_h_flip)
-
-		if self.mode == 'valid':
-			[source_img, target_img] = align([source_img, target_img], self.size)
-
-		return {'source': hwc_to_chw(source_img), 'target': hwc_to_chw(target_img), 'filename': img_name}
-
-
-class SingleLoader(Dataset):
-	def __init__(self, root_dir):
-		self.root_dir = root_dir
-		self.img_names = sorted(os.listdir(self.root_dir))
-		self.img_num = len(self.img_names)
-
-	def __len__(self):
-		return self.img_num
-
-	def __getitem__(self, idx):
-		cv2.setNumThreads(0)
-		cv2.ocl.setUseOpenCL(False)
-
-		# read image, and scale [0, 1] to [-1, 1]
-		img_name = self.img_names[idx]
-		img = read_img(os.path.join(self.root_dir, img_name)) * 2 - 1
-
-		return {'img': hwc_to_chw(img), 'filename': img_name}
+import os
+import random
+import numpy as np
+import cv2
+import torch
+
+from torch.utils.data import Dataset, Sampler
+from utils import hwc_to_chw, read_img, read_img_uint8, read_img_size
+from .manifest import load_manifest
+
+
+def to_float(img):
+	return img.astype('float32') / 255.0
+
+
+def get_augment_params(H, W, size=256, edge_decay=0., only_h_flip=False):
+	Hc, Wc = [size, size]
+
+	# simple re-weight for the edge
+	if random.random() < Hc / H * edge_decay:
+		Hs = 0 if random.randint(0, 1) == 0 else H - Hc
+	else:
+		Hs = random.randint(0, H-Hc)
+
+	if random.random() < Wc / W * edge_decay:
+		Ws = 0 if random.randint(0, 1) == 0 else W - Wc
+	else:
+		Ws = random.randint(0, W-Wc)
+
+	# horizontal flip
+	h_flip = random.randint(0, 1)
+
+	# bad data augmentations for outdoor
+	rot_deg = 0 if only_h_flip else random.randint(0, 3)
+
+	return Hs, Ws, h_flip, rot_deg
+
+
+def augment(imgs=[], size=256, edge_decay=0., only_h_flip=False):
+	H, W, _ = imgs[0].shape
+	Hs, Ws, h_flip, rot_deg = get_augment_params(H, W, size, edge_decay, only_h_flip)
+
+	for i in range(len(imgs)):
+		imgs[i] = imgs[i][Hs:(Hs+size), Ws:(Ws+size), :]
+
+	if h_flip == 1:
+		for i in range(len(imgs)):
+			imgs[i] = np.flip(imgs[i], axis=1)
+
+	if not only_h_flip:
+		for i in range(len(imgs)):
+			imgs[i] = np.rot90(imgs[i], rot_deg, (0, 1))
+			
+	return imgs
+
+
+def merge_patches(batch):
+	# (B, K, ...) batches from patches_per_image > 1 become (B*K, ...)
+	if batch['source'].dim() == 5:
+		for key in ['source', 'target', 'h_flip', 'rot_deg']:
+			if key in batch:
+				batch[key] = batch[key].flatten(0, 1)
+	return batch
+
+
+_dihedral_index = {}
+
+
+def get_dihedral_index(H, W, device):
+	# source pixel of every output pixel for the 8 flip/rot90 combinations, index h_flip * 4 + rot_deg
+	key = (H, W, str(device))
+	if key not in _dihedral_index:
+		base = torch.arange(H * W, device=device).view(H, W)
+		index = []
+		for h_flip in range(2):
+			flipped = base.flip(1) if h_flip else base
+			for rot_deg in range(4):
+				index.append(torch.rot90(flipped, rot_deg, (0, 1)).reshape(-1))
+		_dihedral_index[key] = torch.stack(index)
+	return _dihedral_index[key]
+
+
+def batch_augment(batch, device):
+	"""Applies the flips and rotations drawn by the workers to a uint8 batch, and scales it to [-1, 1]"""
+	imgs = torch.cat([batch['source'], batch['target']], dim=1).to(device, non_blocking=True)
+	B, C, H, W = imgs.shape
+	assert H == W, 'rot90 needs square crops'
+
+	# one gather applies every sample's own flip and rotation
+	index = get_dihedral_index(H, W, imgs.device)[(batch['h_flip'] * 4 + batch['rot_deg']).to(imgs.device)]
+	imgs = imgs.flatten(2).gather(2, index.unsqueeze(1).expand(B, C, H * W)).view(B, C, H, W)
+
+	# scale [0, 1] to [-1, 1]
+	imgs = imgs.float() / 255.0 * 2 - 1
+	return imgs.chunk(2, dim=1)
+
+
+def align(imgs=[], size=256):
+	H, W, _ = imgs[0].shape
+	Hc, Wc = [size, size]
+
+	Hs = (H - Hc) // 2
+	Ws = (W - Wc) // 2
+	for i in range(len(imgs)):
+		imgs[i] = imgs[i][Hs:(Hs+Hc), Ws:(Ws+Wc), :]
+
+	return imgs
+
+
+class PairLoader(Dataset):
+	def __init__(self, data_dir, sub_dir, mode, size=256, edge_decay=0, only_h_flip=False, uint8=False,
+				 patches_per_image=1):
+		assert mode in ['train', 'valid', 'test']
+
+		self.mode = mode
+		self.size = size
+		self.edge_decay = edge_decay
+		self.only_h_flip = only_h_flip
+		self.uint8 = uint8
+		self.patches_per_image = patches_per_image
+
+		# names are kept in a NumPy str array, forked workers would copy a list of str objects
+		self.img_names = self.load_index(data_dir, sub_dir)
+		self.img_num = len(self.img_names)
+
+	def load_index(self, data_dir, sub_dir):
+		# sets root_dir and returns the image names, subclasses read other stores
+		self.root_dir = os.path.join(data_dir, sub_dir) # data/RESIDE-IN/train
+
+		self.manifest = load_manifest(self.root_dir)
+		if self.manifest is not None:
+			return self.manifest.names
+		return np.array(sorted(os.listdir(os.path.join(self.root_dir, 'GT'))), dtype=np.str_)
+
+	def __len__(self):
+		return self.img_num
+
+	def get_img_sizes(self):
+		if self.manifest is not None:
+			return self.manifest.get_img_sizes()
+		return [read_img_size(os.path.join(self.root_dir, 'hazy', img_name)) for img_name in self.img_names]
+
+	def read_pair(self, idx):
+		# uint8 RGB images, cropping happens before the conversion to float
+		img_name = self.img_names[idx]
+		source_img = read_img_uint8(os.path.join(self.root_dir, 'hazy', img_name))
+		target_img = read_img_uint8(os.path.join(self.root_dir, 'GT', img_name))
+		return source_img, target_img
+
+	def __getitem__(self, idx):
+		cv2.setNumThreads(0)
+		cv2.ocl.setUseOpenCL(False)
+		# print(self.img_names)
+
+		img_name = self.img_names[idx]
+		source_img, target_img = self.read_pair(idx)
+
+		if self.mode == 'train' and self.patches_per_image > 1:
+			# one decode, K independent crops stacked along a new first dim
+			items = [self.get_item(source_img, target_img, img_name) for _ in range(self.patches_per_image)]
+			return {key: np.stack([item[key] for item in items]) if key != 'filename' else img_name for key in items[0]}
+
+		return self.get_item(source_img, target_img, img_name)
+
+	def get_item(self, source_img, target_img, img_name):
+		if self.uint8:
+			return self.get_uint8_item(source_img, target_img, img_name)
+		
+		if self.mode == 'train':
+			[source_img, target_img] = augment([source_img, target_img], self.size, self.edge_decay, self.only_h_flip)
+
+		if self.mode == 'valid':
+			[source_img, target_img] = align([source_img, target_img], self.size)
+
+		# scale [0, 1] to [-1, 1]
+		source_img = to_float(source_img) * 2 - 1
+		target_img = to_float(target_img) * 2 - 1
+
+		return {'source': hwc_to_chw(source_img), 'target': hwc_to_chw(target_img), 'filename': img_name}
+
+	def get_uint8_item(self, source_img, target_img, img_name):
+		# only the crop is done here, flips, rotations and scaling are applied by batch_augment
+		h_flip, rot_deg = 0, 0
+		if self.mode == 'train':
+			H, W, _ = source_img.shape
+			Hs, Ws, h_flip, rot_deg = get_augment_params(H, W, self.size, self.edge_decay, self.only_h_flip)
+			[source_img, target_img] = [img[Hs:(Hs+self.size), Ws:(Ws+self.size), :] for img in [source_img, target_img]]
+
+		if self.mode == 'valid':
+			[source_img, target_img] = align([source_img, target_img], self.size)
+
+		return {'source': hwc_to_chw(source_img), 'target': hwc_to_chw(target_img),
+				'h_flip': h_flip, 'rot_deg': rot_deg, 'filename': img_name}
+
+
+class BucketBatchSampler(Sampler):
+	"""Batches indices of images with the same size"""
+	def __init__(self, sizes, batch_size):
+		buckets = {}
+		for idx, size in enumerate(sizes):
+			buckets.setdefault(tuple(size), []).append(idx)
+
+		self.batches = []
+		for indices in buckets.values():
+			for i in range(0, len(indices), batch_size):
+				self.batches.append(indices[i:i+batch_size])
+
+	def __len__(self):
+		return len(self.batches)
+
+	def __iter__(self):
+		return iter(self.batches)
+
+
+class SingleLoader(Dataset):
+	def __init__(self, root_dir):
+		self.root_dir = root_dir
+		self.img_names = sorted(os.listdir(self.root_dir))
+		self.img_num = len(self.img_names)
+
+	def __len__(self):
+		return self.img_num
+
+	def __getitem__(self, idx):
+		cv2.setNumThreads(0)
+		cv2.ocl.setUseOpenCL(False)
+
+		# read image, and scale [0, 1] to [-1, 1]
+		img_name = self.img_names[idx]
+		img = read_img(os.path.join(self.root_dir, img_name)) * 2 - 1
+
+		return {'img': hwc_to_chw(img), 'filename': img_name}
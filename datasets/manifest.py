@@ -0,0 +1,85 @@
+import os
+import numpy as np
+
+from utils import read_img_shape
+
+
+MANIFEST_NAME = 'manifest.npz'
+SUB_DIRS = ['hazy', 'GT']
+
+
+def get_file_stamps(root_dir):
+	# name, size and mtime of every file, an image overwritten in place keeps its folder mtime
+	stamps = {}
+	for sub_dir in SUB_DIRS:
+		entries = sorted(os.scandir(os.path.join(root_dir, sub_dir)), key=lambda e: e.name)
+		stats = [e.stat() for e in entries]
+		stamps[sub_dir + '_files'] = np.array([e.name for e in entries], dtype=np.str_)
+		stamps[sub_dir + '_stats'] = np.array([(st.st_size, st.st_mtime_ns) for st in stats], dtype=np.int64).reshape(-1, 2)
+	return stamps
+
+
+def get_dir_stamps(root_dir):
+	# mtime and file count of each folder, changes when files are added, removed or renamed
+	stamps = {}
+	for sub_dir in SUB_DIRS:
+		dir_name = os.path.join(root_dir, sub_dir)
+		stamps[sub_dir + '_dir'] = np.array([os.stat(dir_name).st_mtime_ns, len(os.listdir(dir_name))], dtype=np.int64)
+	return stamps
+
+
+def is_current(data, stamps):
+	return all(key in data.files and np.array_equal(data[key], value) for key, value in stamps.items())
+
+
+def build_manifest(root_dir):
+	"""Records name, height, width and channels of every hazy/GT pair of root_dir"""
+	img_names = sorted(os.listdir(os.path.join(root_dir, 'GT')))
+
+	shapes = np.zeros((len(img_names), 2, 3), dtype=np.int32)		# hazy, GT
+	for idx, img_name in enumerate(img_names):
+		for i, sub_dir in enumerate(SUB_DIRS):
+			shapes[idx, i] = read_img_shape(os.path.join(root_dir, sub_dir, img_name))
+
+	manifest = Manifest(np.array(img_names, dtype=np.str_), shapes)
+	np.savez(os.path.join(root_dir, MANIFEST_NAME), names=manifest.names, shapes=manifest.shapes,
+			 **get_dir_stamps(root_dir), **get_file_stamps(root_dir))
+	return manifest
+
+
+def load_manifest(root_dir, verify=False):
+	"""Returns the manifest of root_dir, or None if it is missing or out of date
+
+	The folder mtimes and file counts are compared first, every file is only stat'ed when they differ.
+	An image overwritten in place keeps its folder mtime, verify=True always compares the files.
+	"""
+	filename = os.path.join(root_dir, MANIFEST_NAME)
+	if not os.path.exists(filename):
+		return None
+
+	data = np.load(filename)
+	if not verify and is_current(data, get_dir_stamps(root_dir)):
+		return Manifest(data['names'], data['shapes'])
+
+	# a touched folder may still hold the same files
+	if not is_current(data, get_file_stamps(root_dir)):
+		return None		# older manifests only stored the folder mtimes
+	return Manifest(data['names'], data['shapes'])
+
+
+class Manifest(object):
+	"""Image names and shapes in flat NumPy arrays, forked workers share them without refcount copies"""
+	def __init__(self, names, shapes):
+		self.names = names		# fixed-width str array
+		self.shapes = shapes	# (N, 2, 3) int32, hazy and GT (H, W, C)
+
+	def __len__(self):
+		return len(self.names)
+
+	def get_img_sizes(self):
+		return self.shapes[:, 0, :2]
+
+	def get_mismatched(self):
+		# names of pairs whose hazy and GT shapes differ
+		mismatched = (self.shapes[:, 0] != self.shapes[:, 1]).any(axis=1)
+		return self.names[mismatched].tolist()
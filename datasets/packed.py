@@ -0,0 +1,77 @@
+import os
+import numpy as np
+
+from utils import read_img_uint8
+from .loader import PairLoader
+
+
+def pack_pairs(root_dir, out_dir, shard_size=4 << 30):
+	"""Stores the decoded hazy/GT pairs of root_dir as uint8 HWC arrays in shard files"""
+	img_names = sorted(os.listdir(os.path.join(root_dir, 'GT')))
+	os.makedirs(out_dir, exist_ok=True)
+
+	num = len(img_names)
+	shards = np.zeros(num, dtype=np.int32)
+	offsets = np.zeros((num, 2), dtype=np.int64)		# hazy, GT
+	shapes = np.zeros((num, 2, 3), dtype=np.int32)
+
+	shard, shard_bytes, f = 0, 0, None
+	for idx, img_name in enumerate(img_names):
+		imgs = [np.ascontiguousarray(read_img_uint8(os.path.join(root_dir, sub_dir, img_name)))
+				for sub_dir in ['hazy', 'GT']]
+		size = sum(img.nbytes for img in imgs)
+
+		if f is None or (shard_bytes > 0 and shard_bytes + size > shard_size):
+			if f is not None:
+				f.close()
+				shard += 1
+			f = open(os.path.join(out_dir, 'shard_%03d.bin' % shard), 'wb')
+			shard_bytes = 0
+
+		shards[idx] = shard
+		for i, img in enumerate(imgs):
+			offsets[idx, i] = shard_bytes
+			shapes[idx, i] = img.shape
+			f.write(img.tobytes())
+			shard_bytes += img.nbytes
+
+	if f is not None:
+		f.close()
+
+	# written last, a store without an index is incomplete
+	np.savez(os.path.join(out_dir, 'index.npz'), names=np.array(img_names, dtype=np.str_),
+			 shards=shards, offsets=offsets, shapes=shapes)
+
+
+class PackedPairLoader(PairLoader):
+	"""PairLoader over a store written by pack_pairs, crops are sliced from the memory map"""
+	def load_index(self, data_dir, sub_dir):
+		self.root_dir = os.path.join(data_dir, sub_dir + '_packed') # data/RESIDE-IN/train_packed
+		index = np.load(os.path.join(self.root_dir, 'index.npz'))
+		self.shards = index['shards']
+		self.offsets = index['offsets']
+		self.shapes = index['shapes']
+
+		# opened lazily, so each DataLoader worker maps the shards itself
+		self.shard_maps = {}
+
+		# stores written before names were kept as str hold bytes, decoded once here
+		return index['names'].astype(np.str_, copy=False)
+
+	def get_img_sizes(self):
+		return [tuple(shape[:2]) for shape in self.shapes[:, 0].tolist()]
+
+	def get_shard(self, shard):
+		if shard not in self.shard_maps:
+			self.shard_maps[shard] = np.memmap(os.path.join(self.root_dir, 'shard_%03d.bin' % shard),
+											   dtype=np.uint8, mode='r')
+		return self.shard_maps[shard]
+
+	def read_pair(self, idx):
+		shard = self.get_shard(int(self.shards[idx]))
+		imgs = []
+		for i in range(2):
+			offset, shape = int(self.offsets[idx, i]), tuple(self.shapes[idx, i])
+			size = shape[0] * shape[1] * shape[2]
+			imgs.append(shard[offset:offset+size].reshape(shape))		# a view, no data is read yet
+		return imgs[0], imgs[1]
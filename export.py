@@ -0,0 +1,79 @@
+import os
+import argparse
+import math
+import numpy as np
+import torch
+
+from utils import set_device, load_checkpoint
+from utils.runtime import TorchRunner, OnnxRunner, load_torchscript
+from models import *
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', default='msrformer-s', type=str, help='model name')
+parser.add_argument('--save_dir', default='saved_models/', type=str, help='path to models saving')
+parser.add_argument('--exp', default='indoor', type=str, help='experiment setting')
+parser.add_argument('--out_dir', default='exported/', type=str, help='path to exported models')
+parser.add_argument('--formats', default='torchscript,onnx', type=str, help='comma separated export formats')
+parser.add_argument('--size', default=256, type=int, help='size of the example input used for tracing')
+parser.add_argument('--opset', default=17, type=int, help='ONNX opset version')
+parser.add_argument('--check_sizes', default='256x256,288x416,480x640', type=str,
+					help='comma separated HxW inputs compared with eager mode')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+args = parser.parse_args()
+
+device = set_device('cpu', args.num_threads)
+
+
+def check_parity(name, runner, inputs, references):
+	# outputs are in [-1, 1], PSNR is computed on [0, 1] as in test.py
+	for x, reference in zip(inputs, references):
+		output = runner(x)
+		mse = np.mean((output * 0.5 - reference * 0.5) ** 2)
+		psnr = 10 * math.log10(1 / mse) if mse > 0 else float('inf')
+		print('{0:<12s} {1:>5d}x{2:<5d} max abs error {3:.06f}\tPSNR vs eager {4:.02f}'
+			  .format(name, x.shape[2], x.shape[3], np.abs(output - reference).max(), psnr))
+
+
+if __name__ == '__main__':
+	network = eval(args.model.replace('-', '_'))()
+	saved_model_dir = os.path.join(args.save_dir, args.exp, args.model+'.pth')
+
+	if os.path.exists(saved_model_dir):
+		print('==> Export trained model: ' + args.model)
+		load_checkpoint(network, saved_model_dir)
+	else:
+		print('==> No existing trained model, exporting random weights')
+
+	# the derived-weight convs are folded, the graph only holds plain convs
+	network.switch_to_deploy()
+	network.eval()
+
+	os.makedirs(args.out_dir, exist_ok=True)
+	example = torch.rand(1, 3, args.size, args.size) * 2 - 1
+
+	# H and W of the exported graphs are dynamic, so they are checked at other sizes than the example
+	sizes = [tuple(int(v) for v in size.split('x')) for size in args.check_sizes.split(',')]
+	inputs = [(np.random.rand(1, 3, h, w) * 2 - 1).astype(np.float32) for h, w in sizes]
+	eager = TorchRunner(network, device)
+	references = [eager(x) for x in inputs]
+
+	formats = args.formats.split(',')
+	if 'torchscript' in formats:
+		filename = os.path.join(args.out_dir, args.model+'.pt')
+		with torch.no_grad():
+			traced = torch.jit.trace(network, example, check_trace=False)
+		traced.save(filename)
+		print('==> Saved ' + filename)
+		check_parity('torchscript', load_torchscript(filename, device), inputs, references)
+
+	if 'onnx' in formats:
+		filename = os.path.join(args.out_dir, args.model+'.onnx')
+		# the dynamo exporter never sets torch.jit.is_tracing(), the DFT fallbacks need the tracing one
+		with torch.no_grad():
+			torch.onnx.export(network, example, filename, opset_version=args.opset, dynamo=False,
+							  input_names=['hazy'], output_names=['dehazed'],
+							  dynamic_axes={'hazy': {0: 'batch', 2: 'height', 3: 'width'},
+											'dehazed': {0: 'batch', 2: 'height', 3: 'width'}})
+		print('==> Saved ' + filename)
+		check_parity('onnxruntime', OnnxRunner(filename, args.num_threads), inputs, references)
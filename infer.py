@@ -0,0 +1,48 @@
+import os
+import argparse
+import time
+
+from utils import read_img, write_img, hwc_to_chw, chw_to_hwc, set_device
+from utils.runtime import TorchRunner, OnnxRunner, load_torchscript
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--backend', default='onnxruntime', type=str, help='onnxruntime, torchscript or eager')
+parser.add_argument('--model_path', default='exported/msrformer-s.onnx', type=str,
+					help='exported model, or a checkpoint for the eager backend')
+parser.add_argument('--model', default='msrformer-s', type=str, help='model name for the eager backend')
+parser.add_argument('--input_dir', default='data/RESIDE-IN/test/hazy', type=str, help='folder of hazy images')
+parser.add_argument('--output_dir', default='results/infer', type=str, help='folder of dehazed images')
+parser.add_argument('--device', default='cpu', type=str, help='device of the torch backends')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+args = parser.parse_args()
+
+
+def load_runner():
+	if args.backend == 'onnxruntime':
+		return OnnxRunner(args.model_path, args.num_threads)
+
+	device = set_device(args.device, args.num_threads)
+	if args.backend == 'torchscript':
+		return load_torchscript(args.model_path, device)
+	if args.backend == 'eager':
+		from models import msrformer_s, msrformer_l		# the only backend that needs the model code
+		from utils import load_checkpoint
+		network = eval(args.model.replace('-', '_'))()
+		load_checkpoint(network, args.model_path)
+		return TorchRunner(network.switch_to_deploy().to(device), device)
+	raise Exception("ERROR: unsupported backend " + args.backend)
+
+
+if __name__ == '__main__':
+	runner = load_runner()
+	os.makedirs(args.output_dir, exist_ok=True)
+
+	img_names = sorted(os.listdir(args.input_dir))
+	start = time.time()
+	for img_name in img_names:
+		img = hwc_to_chw(read_img(os.path.join(args.input_dir, img_name))) * 2 - 1
+		output = runner(img[None])[0] * 0.5 + 0.5
+		write_img(os.path.join(args.output_dir, img_name), chw_to_hwc(output))
+
+	print('==> {0} images in {1:.02f} s with {2}'.format(len(img_names), time.time() - start, args.backend))
@@ -1 +1 @@
-from .msrformer import msrformer_s, msrformer_l
\ No newline at end of file
+from .msrformer import MSRFormer_s as msrformer_s, MSRFormer_l as msrformer_l, get_bias_cache_stats
\ No newline at end of file
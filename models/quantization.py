@@ -0,0 +1,52 @@
+import torch
+import torch.nn as nn
+from torch.ao.quantization import QuantStub, DeQuantStub, get_default_qconfig, prepare, convert
+
+from .msrformer import DFFN, Attention, CGAFusion
+
+
+class QuantizedConv(nn.Module):
+	"""Runs one conv in int8, its input is quantized and its output dequantized so the rest stays float"""
+	def __init__(self, conv):
+		super().__init__()
+		self.quant = QuantStub()
+		self.conv = conv
+		self.dequant = DeQuantStub()
+
+	def forward(self, x):
+		return self.dequant(self.conv(self.quant(x)))
+
+
+def get_quantizable_convs(model):
+	"""(parent, name) of the projection and Conv stack convs, RLN, the FFT paths and the reconstruction are left out"""
+	convs = []
+	for m in model.modules():
+		if isinstance(m, DFFN):
+			convs += [(m, 'project_in'), (m, 'project_out')]
+		elif isinstance(m, Attention):
+			convs += [(m, name) for name in ['QK', 'V', 'proj'] if hasattr(m, name)]
+			if m.use_attn and m.conv_type in ['Conv', 'DWConv']:		# the DEB branch only runs after attention
+				convs += [(m, 'proj2'), (m, 'proj3')]
+			if isinstance(getattr(m, 'conv', None), nn.Sequential):		# the 'Conv' stack
+				convs += [(m.conv, name) for name, child in m.conv.named_children() if isinstance(child, nn.Conv2d)]
+		elif isinstance(m, CGAFusion):
+			convs.append((m, 'conv'))
+	return convs
+
+
+def quantize_model(model, calibrate, backend='fbgemm'):
+	"""Post-training static int8 quantization of the eligible convs, calibrate(model) runs the calibration data"""
+	torch.backends.quantized.engine = backend
+	model.eval()
+
+	qconfig = get_default_qconfig(backend)
+	for parent, name in get_quantizable_convs(model):
+		wrapper = QuantizedConv(getattr(parent, name))
+		wrapper.qconfig = qconfig
+		setattr(parent, name, wrapper)
+
+	prepare(model, inplace=True)		# observers are only inserted where a qconfig is set
+	with torch.no_grad():
+		calibrate(model)
+	convert(model, inplace=True)
+	return model
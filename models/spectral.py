@@ -0,0 +1,132 @@
+import math
+import torch
+
+
+# The FFTs run in fp32 (cuFFT and pocketfft have no bf16 kernels), fp64 inputs stay
+# fp64. The results are returned in the input dtype so autocast does not cast them again.
+
+def _upcast(t):
+	return t if t.dtype == torch.float64 else t.float()
+
+def _patch_fft_correlation(q, k, patch_size):
+	# (a, b, (c patch1 patch2), d) -> (a, b, c, patch1, patch2, d) is a view, the FFT runs over dims 3 and 4
+	q_patch = q.unflatten(2, (-1, patch_size, patch_size))
+	k_patch = k.unflatten(2, (-1, patch_size, patch_size))
+	q_fft = torch.fft.rfftn(_upcast(q_patch), dim=(3, 4))
+	k_fft = torch.fft.rfftn(_upcast(k_patch), dim=(3, 4))
+	out = torch.fft.irfftn(q_fft * k_fft, s=(patch_size, patch_size), dim=(3, 4))
+	return out.flatten(2, 4).to(q.dtype)
+
+
+def _patch_fft_gating(x, weight, patch_size):
+	C = x.shape[1]
+	if C > 1 and x.is_contiguous(memory_format=torch.channels_last):
+		# (b, (h patch1), (w patch2), c) -> (b, h, patch1, w, patch2, c), the output keeps NHWC strides
+		x_patch = x.permute(0, 2, 3, 1).unflatten(2, (-1, patch_size)).unflatten(1, (-1, patch_size))
+		x_fft = torch.fft.rfftn(_upcast(x_patch), dim=(2, 4))
+		weight = weight.reshape(C, patch_size, patch_size // 2 + 1).permute(1, 2, 0).unsqueeze(1)
+		out = torch.fft.irfftn(x_fft * weight, s=(patch_size, patch_size), dim=(2, 4))
+		return out.flatten(3, 4).flatten(1, 2).permute(0, 3, 1, 2).to(x.dtype)
+
+	# (b, c, (h patch1), (w patch2)) -> (b, c, h, patch1, w, patch2) is a view, the FFT runs over dims 3 and 5
+	x_patch = x.unflatten(3, (-1, patch_size)).unflatten(2, (-1, patch_size))
+	x_fft = torch.fft.rfftn(_upcast(x_patch), dim=(3, 5))
+	weight = weight.reshape(C, 1, patch_size, 1, patch_size // 2 + 1)
+	out = torch.fft.irfftn(x_fft * weight, s=(patch_size, patch_size), dim=(3, 5))
+	return out.flatten(4, 5).flatten(2, 3).to(x.dtype)
+
+
+# Traced and exported graphs use dense DFT matrices instead: ONNX has no rfft/irfft
+# pair, and the patches are small enough for matmuls. Same math as above, Re(ifft2(.)).
+
+def _dft_matrices(patch_size, device, dtype=torch.float32):
+	n = torch.arange(patch_size, dtype=torch.float64)
+	angle = 2 * math.pi * torch.outer(n, n) / patch_size
+	return torch.cos(angle).to(device, dtype), torch.sin(angle).to(device, dtype)
+
+
+def _dft2(xr, xi, C, S, sign):
+	# unscaled 2D DFT over the last two dims of xr + i*xi, sign -1 is forward and +1 inverse
+	ar, ai = xr @ C, sign * (xr @ S)
+	if xi is not None:
+		ar, ai = ar - sign * (xi @ S), ai + xi @ C
+	return C @ ar - sign * (S @ ai), C @ ai + sign * (S @ ar)
+
+
+def _patch_dft_correlation(q, k, patch_size):
+	# (a, b, (c patch1 patch2), d) -> (a, b, c, d, patch1, patch2)
+	q_patch = _upcast(q.unflatten(2, (-1, patch_size, patch_size)).permute(0, 1, 2, 5, 3, 4))
+	k_patch = _upcast(k.unflatten(2, (-1, patch_size, patch_size)).permute(0, 1, 2, 5, 3, 4))
+	C, S = _dft_matrices(patch_size, q.device, q_patch.dtype)
+	qr, qi = _dft2(q_patch, None, C, S, -1)
+	kr, ki = _dft2(k_patch, None, C, S, -1)
+	out, _ = _dft2(qr * kr - qi * ki, qr * ki + qi * kr, C, S, 1)
+	out = out / patch_size ** 2
+	return out.permute(0, 1, 2, 4, 5, 3).flatten(2, 4).to(q.dtype)
+
+
+def _patch_dft_gating(x, weight, patch_size):
+	# the half spectrum weight is extended to the full spectrum as irfftn implies it,
+	# w[k1, k2] = w[-k1, -k2] for k2 past the Nyquist bin
+	half = weight.reshape(-1, patch_size, patch_size // 2 + 1)
+	neg = [(patch_size - i) % patch_size for i in range(patch_size)]
+	tail = half[:, neg][:, :, [patch_size - i for i in range(patch_size // 2 + 1, patch_size)]]
+	full = _upcast(torch.cat([half, tail], dim=2))[None, :, None, None]
+
+	# (b, c, (h patch1), (w patch2)) -> (b, c, h, w, patch1, patch2)
+	x_patch = _upcast(x.unflatten(3, (-1, patch_size)).unflatten(2, (-1, patch_size)).permute(0, 1, 2, 4, 3, 5))
+	C, S = _dft_matrices(patch_size, x.device, x_patch.dtype)
+	xr, xi = _dft2(x_patch, None, C, S, -1)
+	out, _ = _dft2(xr * full, xi * full, C, S, 1)
+	out = out / patch_size ** 2
+	return out.permute(0, 1, 2, 4, 3, 5).flatten(4, 5).flatten(2, 3).to(x.dtype)
+
+
+class PatchFFTCorrelation(torch.autograd.Function):
+	"""Circular correlation of q and k inside each patch, computed in the frequency domain"""
+	@staticmethod
+	def forward(ctx, q, k, patch_size):
+		# only the real inputs are kept, the complex spectra are recomputed in backward
+		ctx.save_for_backward(q, k)
+		ctx.patch_size = patch_size
+		return _patch_fft_correlation(q, k, patch_size)
+
+	@staticmethod
+	def backward(ctx, grad):
+		q, k = ctx.saved_tensors
+		return _recompute_grad(_patch_fft_correlation, (q, k), ctx.needs_input_grad[:2], grad, ctx.patch_size) + (None,)
+
+
+class PatchFFTGating(torch.autograd.Function):
+	"""Per-channel filtering of every patch with a learned half spectrum"""
+	@staticmethod
+	def forward(ctx, x, weight, patch_size):
+		ctx.save_for_backward(x, weight)
+		ctx.patch_size = patch_size
+		return _patch_fft_gating(x, weight, patch_size)
+
+	@staticmethod
+	def backward(ctx, grad):
+		x, weight = ctx.saved_tensors
+		return _recompute_grad(_patch_fft_gating, (x, weight), ctx.needs_input_grad[:2], grad, ctx.patch_size) + (None,)
+
+
+def _recompute_grad(fn, inputs, needs_grad, grad, patch_size):
+	with torch.enable_grad():
+		inputs = [t.detach().requires_grad_(need) for t, need in zip(inputs, needs_grad)]
+		out = fn(*inputs, patch_size)
+	wrt = [t for t in inputs if t.requires_grad]
+	grads = iter(torch.autograd.grad(out, wrt, grad)) if wrt else iter(())
+	return tuple(next(grads) if t.requires_grad else None for t in inputs)
+
+
+def patch_fft_correlation(q, k, patch_size=8):
+	if torch.jit.is_tracing():
+		return _patch_dft_correlation(q, k, patch_size)
+	return PatchFFTCorrelation.apply(q, k, patch_size)
+
+
+def patch_fft_gating(x, weight, patch_size=8):
+	if torch.jit.is_tracing():
+		return _patch_dft_gating(x, weight, patch_size)
+	return PatchFFTGating.apply(x, weight, patch_size)
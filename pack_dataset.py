@@ -0,0 +1,20 @@
+import os
+import argparse
+
+from datasets.packed import pack_pairs
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--data_dir', default='data/', type=str, help='path to dataset')
+parser.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
+parser.add_argument('--sub_dirs', default='train,test', type=str, help='comma separated splits to pack')
+parser.add_argument('--shard_size', default=4, type=int, help='maximum shard size in GB')
+args = parser.parse_args()
+
+
+if __name__ == '__main__':
+	for sub_dir in args.sub_dirs.split(','):
+		root_dir = os.path.join(args.data_dir, args.dataset, sub_dir)
+		out_dir = root_dir + '_packed'
+		print('==> Packing ' + root_dir + ' into ' + out_dir)
+		pack_pairs(root_dir, out_dir, args.shard_size << 30)
@@ -0,0 +1,88 @@
+import os
+import argparse
+import copy
+import time
+import torch
+
+from utils import AverageMeter, set_device, load_checkpoint
+from utils.metrics import psnr, downsampled_ssim
+from datasets.loader import PairLoader
+from models import *
+from models.quantization import quantize_model, get_quantizable_convs
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--models', default='msrformer-s,msrformer-l', type=str, help='comma separated model names')
+parser.add_argument('--save_dir', default='saved_models/', type=str, help='path to models saving')
+parser.add_argument('--exp', default='indoor', type=str, help='experiment setting')
+parser.add_argument('--data_dir', default='data/', type=str, help='path to dataset')
+parser.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
+parser.add_argument('--num_calib', default=200, type=int, help='training crops used for calibration')
+parser.add_argument('--calib_size', default=256, type=int, help='size of the calibration crops')
+parser.add_argument('--num_eval', default=50, type=int, help='test images used for PSNR/SSIM and latency')
+parser.add_argument('--backend', default='fbgemm', type=str, help='quantized engine (fbgemm on x86, qnnpack on arm)')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+parser.add_argument('--out_dir', default='exported/', type=str, help='path to the traced int8 models')
+args = parser.parse_args()
+
+device = set_device('cpu', args.num_threads)		# int8 kernels are cpu only
+
+
+def calibrate(network, dataset):
+	for idx in range(min(args.num_calib, len(dataset))):
+		network(torch.from_numpy(dataset[idx]['source'])[None])
+
+
+def evaluate(network, dataset):
+	PSNR = AverageMeter()
+	SSIM = AverageMeter()
+	elapsed = 0
+
+	with torch.no_grad():
+		for idx in range(min(args.num_eval, len(dataset))):
+			sample = dataset[idx]
+			source = torch.from_numpy(sample['source'])[None]
+			target = torch.from_numpy(sample['target'])[None] * 0.5 + 0.5
+
+			start = time.perf_counter()
+			output = network(source).clamp_(-1, 1) * 0.5 + 0.5
+			elapsed += time.perf_counter() - start
+
+			PSNR.update(psnr(output, target).item())
+			SSIM.update(downsampled_ssim(output, target).item())
+
+	return PSNR.avg, SSIM.avg, elapsed / max(1, PSNR.count) * 1000
+
+
+if __name__ == '__main__':
+	dataset_dir = os.path.join(args.data_dir, args.dataset)
+	calib_dataset = PairLoader(dataset_dir, 'train', 'valid', args.calib_size)
+	test_dataset = PairLoader(dataset_dir, 'test', 'test')
+	os.makedirs(args.out_dir, exist_ok=True)
+
+	print('{0:<14s} {1:<6s} {2:>8s} {3:>8s} {4:>12s} {5:>8s}'.format('model', 'dtype', 'PSNR', 'SSIM', 'ms/img', 'speedup'))
+	for name in args.models.split(','):
+		network = eval(name.replace('-', '_'))()
+		saved_model_dir = os.path.join(args.save_dir, args.exp, name+'.pth')
+		if os.path.exists(saved_model_dir):
+			load_checkpoint(network, saved_model_dir)
+		else:
+			print('==> No existing trained model for ' + name + ', using random weights')
+		network.switch_to_deploy().eval()
+
+		float_stats = evaluate(network, test_dataset)
+
+		num_convs = len(get_quantizable_convs(network))
+		qnetwork = quantize_model(copy.deepcopy(network), lambda m: calibrate(m, calib_dataset), args.backend)
+		int8_stats = evaluate(qnetwork, test_dataset)
+
+		for dtype, (avg_psnr, avg_ssim, latency) in [('fp32', float_stats), ('int8', int8_stats)]:
+			print('{0:<14s} {1:<6s} {2:>8.02f} {3:>8.04f} {4:>12.01f} {5:>7.02f}x'
+				  .format(name, dtype, avg_psnr, avg_ssim, latency, float_stats[2] / latency))
+		print('{0:<14s} {1} convs in int8, PSNR drop {2:.02f} dB, SSIM drop {3:.04f}'
+			  .format(name, num_convs, float_stats[0] - int8_stats[0], float_stats[1] - int8_stats[1]))
+
+		# traced, so it can be run with infer.py --backend torchscript
+		filename = os.path.join(args.out_dir, name+'-int8.pt')
+		with torch.no_grad():
+			torch.jit.trace(qnetwork, torch.rand(1, 3, args.calib_size, args.calib_size) * 2 - 1, check_trace=False).save(filename)
@@ -0,0 +1,226 @@
+import os
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import torch
+
+from utils import set_device, load_checkpoint
+from models import *
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', default='msrformer-s', type=str, help='model name')
+parser.add_argument('--save_dir', default='saved_models/', type=str, help='path to models saving')
+parser.add_argument('--exp', default='outdoor', type=str, help='experiment setting')
+parser.add_argument('--host', default='127.0.0.1', type=str, help='address to listen on, local only by default')
+parser.add_argument('--port', default=8080, type=int, help='port to listen on')
+parser.add_argument('--deploy', action='store_true', default=False, help='fuse DEConv branches before serving')
+parser.add_argument('--device', default='cuda', type=str, help='device used for inference (cuda or cpu)')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+parser.add_argument('--amp_dtype', default='', type=str, help='run under autocast with this dtype (bfloat16 or float16)')
+parser.add_argument('--max_batch', default=8, type=int, help='largest batch of same-size images')
+parser.add_argument('--max_delay', default=10, type=float, help='ms a request may wait for its batch to fill')
+parser.add_argument('--max_body_mb', default=64, type=int, help='largest accepted request body')
+args = parser.parse_args()
+
+device = set_device(args.device, args.num_threads)
+amp_dtype = getattr(torch, args.amp_dtype) if args.amp_dtype else None
+
+
+def dehaze(network, imgs):
+	# uint8 BGR images of the same size in and out, the conversion runs on the device
+	x = torch.from_numpy(np.stack(imgs)).to(device)
+	x = x.flip(3).permute(0, 3, 1, 2).float() / 255.0 * 2 - 1
+
+	with torch.no_grad():
+		with torch.autocast(device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
+			output = network(x)
+
+	output = (output.float().clamp_(-1, 1) * 0.5 + 0.5) * 255.0
+	output = output.round_().to(torch.uint8).permute(0, 2, 3, 1).flip(3)
+	return list(output.contiguous().cpu().numpy())
+
+
+class Batcher(object):
+	"""Queues images by size, a bucket runs when it is full or its oldest request reaches the deadline"""
+	def __init__(self, network, max_batch, max_delay):
+		self.network = network
+		self.max_batch = max_batch
+		self.max_delay = max_delay
+		self.buckets = {}				# (H, W) -> [(img, future, arrival)]
+		self.wakeup = asyncio.Event()
+		self.executor = ThreadPoolExecutor(1)		# one forward at a time, torch releases the GIL
+
+		self.batch_sizes = Counter()
+		self.latencies = deque(maxlen=10000)		# seconds, of the latest requests
+		self.requests = 0
+
+	def queue_depth(self):
+		return sum(len(bucket) for bucket in self.buckets.values())
+
+	async def submit(self, img):
+		future = asyncio.get_running_loop().create_future()
+		self.buckets.setdefault(img.shape, []).append((img, future, time.perf_counter()))
+		self.wakeup.set()
+		return await future
+
+	def next_bucket(self):
+		# a full bucket, or the one with the oldest expired request, else the time to the next deadline
+		now = time.perf_counter()
+		timeout = None
+		for key, bucket in self.buckets.items():
+			if len(bucket) >= self.max_batch:
+				return key, None
+			remaining = bucket[0][2] + self.max_delay - now
+			if remaining <= 0:
+				return key, None
+			timeout = remaining if timeout is None else min(timeout, remaining)
+		return None, timeout
+
+	async def run(self):
+		loop = asyncio.get_running_loop()
+		while True:
+			self.wakeup.clear()
+			key, timeout = self.next_bucket()
+			if key is None:
+				try:
+					await asyncio.wait_for(self.wakeup.wait(), timeout)
+				except asyncio.TimeoutError:
+					pass
+				continue
+
+			bucket = self.buckets[key]
+			batch, self.buckets[key] = bucket[:self.max_batch], bucket[self.max_batch:]
+			if not self.buckets[key]:
+				del self.buckets[key]
+
+			self.batch_sizes[len(batch)] += 1
+			try:
+				outputs = await loop.run_in_executor(self.executor, dehaze, self.network, [img for img, _, _ in batch])
+			except Exception as e:
+				for _, future, _ in batch:
+					if not future.done():
+						future.set_exception(e)
+				continue
+
+			for (_, future, _), output in zip(batch, outputs):
+				if not future.done():		# the client may have gone away
+					future.set_result(output)
+
+	def metrics(self):
+		latencies = sorted(self.latencies)
+		percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.
+		return {'queue_depth': self.queue_depth(),
+				'requests': self.requests,
+				'batch_size_histogram': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+				'latency_ms': {'p50': percentile(0.5), 'p99': percentile(0.99)}}
+
+
+def decode_img(body):
+	# None for an empty or undecodable payload, cv2 raises on an empty buffer
+	if not body:
+		return None
+	try:
+		return cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+	except cv2.error:
+		return None
+
+
+def response(writer, status, content_type, body):
+	writer.write(('HTTP/1.1 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n'
+				  % (status, content_type, len(body))).encode() + body)
+
+
+async def handle(batcher, reader, writer):
+	# one request per connection: POST /dehaze with an encoded image, GET /metrics
+	loop = asyncio.get_running_loop()
+	try:
+		request_line = (await reader.readline()).decode('latin-1').split(' ', 2)
+		if len(request_line) != 3:
+			response(writer, '400 Bad Request', 'text/plain', b'malformed request line')
+			return
+		method, path, _ = request_line
+		headers = {}
+		while True:
+			line = (await reader.readline()).decode('latin-1').strip()
+			if not line:
+				break
+			name, _, value = line.partition(':')
+			headers[name.strip().lower()] = value.strip()
+
+		# bad client input is answered with 400, 500 is left for failures of the server
+		length = headers.get('content-length', '0')
+		if not length.isdigit():
+			response(writer, '400 Bad Request', 'text/plain', b'invalid Content-Length')
+			return
+		length = int(length)
+		if length > args.max_body_mb << 20:
+			response(writer, '413 Payload Too Large', 'text/plain', b'image too large')
+			return
+		try:
+			body = await reader.readexactly(length)
+		except asyncio.IncompleteReadError:
+			response(writer, '400 Bad Request', 'text/plain', b'body shorter than Content-Length')
+			return
+
+		if method == 'POST' and path == '/dehaze':
+			start = time.perf_counter()
+			if not body:
+				response(writer, '400 Bad Request', 'text/plain', b'missing image, send it as the request body')
+				return
+			img = await loop.run_in_executor(None, decode_img, body)
+			if img is None:
+				response(writer, '400 Bad Request', 'text/plain', b'cannot decode image')
+				return
+
+			output = await batcher.submit(img)
+			_, png = await loop.run_in_executor(None, cv2.imencode, '.png', output)
+			batcher.latencies.append(time.perf_counter() - start)
+			batcher.requests += 1
+			response(writer, '200 OK', 'image/png', png.tobytes())
+		elif method == 'GET' and path == '/metrics':
+			response(writer, '200 OK', 'application/json', json.dumps(batcher.metrics()).encode())
+		else:
+			response(writer, '404 Not Found', 'text/plain', b'not found')
+	except Exception as e:
+		response(writer, '500 Internal Server Error', 'text/plain', str(e).encode())
+	finally:
+		try:
+			await writer.drain()
+		finally:
+			writer.close()
+
+
+async def serve(network):
+	batcher = Batcher(network, args.max_batch, args.max_delay / 1000)
+	batch_task = asyncio.ensure_future(batcher.run())
+	server = await asyncio.start_server(lambda r, w: handle(batcher, r, w), args.host, args.port)
+	print('==> Serving on http://{0}:{1} (POST /dehaze, GET /metrics)'.format(args.host, args.port))
+	try:
+		async with server:
+			await server.serve_forever()
+	finally:
+		batch_task.cancel()
+
+
+if __name__ == '__main__':
+	network = eval(args.model.replace('-', '_'))()
+	network.to(device)
+	saved_model_dir = os.path.join(args.save_dir, args.exp, args.model+'.pth')
+
+	if os.path.exists(saved_model_dir):
+		print('==> Start serving, current model name: ' + args.model)
+		load_checkpoint(network, saved_model_dir)
+		if args.deploy:
+			network.switch_to_deploy()
+	else:
+		print('==> No existing trained model!')
+		exit(0)
+	network.eval()
+
+	asyncio.run(serve(network))
@@ -1,14 +1,16 @@
 import os
+import math
+import time
 import argparse
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from pytorch_msssim import ssim
 from torch.utils.data import DataLoader
-from collections import OrderedDict
 
-from utils import AverageMeter, write_img, chw_to_hwc
-from datasets.loader import PairLoader
+from utils import AverageMeter, set_device, load_checkpoint
+from utils.image_writer import ImageWriter
+from utils.metrics import psnr, downsampled_ssim
+from datasets.loader import PairLoader, BucketBatchSampler
 from models import *
 
 
@@ -20,89 +22,159 @@ parser.add_argument('--save_dir', default='saved_models/', type=str, help='path
 parser.add_argument('--result_dir', default='results/', type=str, help='path to results saving')
 parser.add_argument('--dataset', default='RESIDE-OUT', type=str, help='dataset name')
 parser.add_argument('--exp', default='outdoor', type=str, help='experiment setting')
+parser.add_argument('--deploy', action='store_true', default=False, help='fuse DEConv branches before testing')
+parser.add_argument('--device', default='cuda', type=str, help='device used for testing (cuda or cpu)')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+parser.add_argument('--num_interop_threads', default=0, type=int, help='inter-op threads on cpu, 0 for default')
+parser.add_argument('--amp_dtype', default='', type=str, help='run under autocast with this dtype (bfloat16 or float16)')
+parser.add_argument('--batch_size', default=1, type=int, help='number of same-size images per batch')
+parser.add_argument('--tile_size', default=0, type=int, help='tile size for tiled inference, 0 to disable')
+parser.add_argument('--tile_overlap', default=64, type=int, help='overlap between neighbouring tiles, rounded up to a multiple of 32')
+parser.add_argument('--tile_batch', default=4, type=int, help='number of tiles per forward')
+parser.add_argument('--seam_check', action='store_true', default=False, help='compare tiled with full-frame inference')
+parser.add_argument('--write_workers', default=4, type=int, help='threads encoding the output images, 0 writes them in order')
+parser.add_argument('--max_pending_writes', default=16, type=int, help='output images waiting to be written')
+parser.add_argument('--lowres_scale', default=1, type=float, help='predict K and B at 1/scale resolution, 1 to disable')
+parser.add_argument('--gf_radius', default=2, type=int, help='guided filter radius of the low resolution mode')
+parser.add_argument('--gf_eps', default=1e-3, type=float, help='guided filter regularization of the low resolution mode')
+parser.add_argument('--channels_last', action='store_true', default=False, help='run the convs on NHWC-strided tensors')
 args = parser.parse_args()
 
+device = set_device(args.device, args.num_threads, args.num_interop_threads)
+amp_dtype = getattr(torch, args.amp_dtype) if args.amp_dtype else None
 
-def single(save_dir):
-	state_dict = torch.load(save_dir)['state_dict']
-	new_state_dict = OrderedDict()
 
-	for k, v in state_dict.items():
-		name = k[7:]
-		new_state_dict[name] = v
+def seam_check(network, input, output, SEAM):
+	# full-frame reference, skipped for images that do not fit in memory
+	try:
+		full = network(input).clamp_(-1, 1)
+	except RuntimeError as e:
+		if 'out of memory' not in str(e):
+			raise
+		if device.type == 'cuda':
+			torch.cuda.empty_cache()
+		return
 
-	return new_state_dict
+	mse = F.mse_loss(output * 0.5 + 0.5, full * 0.5 + 0.5).item()
+	if mse == 0:		# the image fits in a single tile
+		return
+
+	seam_psnr = 10 * math.log10(1 / mse)
+	SEAM.update(seam_psnr)
+	print('Seam: PSNR {0:.02f}\tmax abs error {1:.04f}'.format(seam_psnr, (output - full).abs().max().item() * 0.5))
 
 
 def test(test_loader, network, result_dir):
 	PSNR = AverageMeter()
 	SSIM = AverageMeter()
+	SEAM = AverageMeter()
 
-	torch.cuda.empty_cache()
+	if device.type == 'cuda':
+		torch.cuda.empty_cache()
 
 	network.eval()
 
 	os.makedirs(os.path.join(result_dir, 'imgs'), exist_ok=True)
 	f_result = open(os.path.join(result_dir, 'results.csv'), 'w')
 
-	for idx, batch in enumerate(test_loader):
-		input = batch['source'].cuda()
-		target = batch['target'].cuda()
-
-		filename = batch['filename'][0]
-
-		with torch.no_grad():
-			output = network(input).clamp_(-1, 1)
-
-			# [-1, 1] to [0, 1]
-			output = output * 0.5 + 0.5
-			target = target * 0.5 + 0.5
-
-			psnr_val = 10 * torch.log10(1 / F.mse_loss(output, target)).item()
-
-			_, _, H, W = output.size()
-			down_ratio = max(1, round(min(H, W) / 256))		# Zhou Wang
-			ssim_val = ssim(F.adaptive_avg_pool2d(output, (int(H / down_ratio), int(W / down_ratio))), 
-							F.adaptive_avg_pool2d(target, (int(H / down_ratio), int(W / down_ratio))), 
-							data_range=1, size_average=False).item()				
-
-		PSNR.update(psnr_val)
-		SSIM.update(ssim_val)
-
-		print('Test: [{0}]\t'
-			  'PSNR: {psnr.val:.02f} ({psnr.avg:.02f})\t'
-			  'SSIM: {ssim.val:.03f} ({ssim.avg:.03f})'
-			  .format(idx, psnr=PSNR, ssim=SSIM))
-
-		f_result.write('%s,%.02f,%.03f\n'%(filename, psnr_val, ssim_val))
-
-		out_img = chw_to_hwc(output.detach().cpu().squeeze(0).numpy())
-		write_img(os.path.join(result_dir, 'imgs', filename), out_img)
+	# conversion and PNG encoding overlap with the forward of the next batch
+	img_writer = ImageWriter(args.write_workers, args.max_pending_writes)
+
+	results = {}
+	idx = 0
+	start_time = time.time()
+	# the pending writes are finished, and their errors raised, even if the loop fails
+	try:
+		for batch in test_loader:
+			input = batch['source'].to(device, non_blocking=True)
+			target = batch['target'].to(device, non_blocking=True)
+
+			with torch.no_grad():
+				with torch.autocast(device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
+					if args.lowres_scale > 1:
+						output = network.forward_lowres(input, args.lowres_scale, args.gf_radius, args.gf_eps).clamp_(-1, 1)
+					elif args.tile_size > 0:
+						output = network.forward_tiled(input, args.tile_size, args.tile_overlap, args.tile_batch).clamp_(-1, 1)
+						if args.seam_check:
+							seam_check(network, input, output, SEAM)
+					else:
+						output = network(input).clamp_(-1, 1)
+
+				# [-1, 1] to [0, 1]
+				output = output.float() * 0.5 + 0.5
+				target = target * 0.5 + 0.5
+
+				# per-image metrics, all images in a batch share the same size
+				psnr_vals = psnr(output, target)
+				ssim_vals = downsampled_ssim(output, target)
+
+			out_imgs = output.detach().cpu().numpy()
+			for filename, psnr_val, ssim_val, out_img in zip(batch['filename'], psnr_vals.tolist(), ssim_vals.tolist(), out_imgs):
+
+				PSNR.update(psnr_val)
+				SSIM.update(ssim_val)
+
+				print('Test: [{0}]\t'
+					  'PSNR: {psnr.val:.02f} ({psnr.avg:.02f})\t'
+					  'SSIM: {ssim.val:.03f} ({ssim.avg:.03f})'
+					  .format(idx, psnr=PSNR, ssim=SSIM))
+				idx += 1
+
+				results[filename] = '%s,%.02f,%.03f\n'%(filename, psnr_val, ssim_val)
+
+				img_writer.write(os.path.join(result_dir, 'imgs', filename), out_img)
+
+	finally:
+		img_writer.close()		# waits for the pending writes, raises their errors
+	elapsed = time.time() - start_time
+	print('Throughput: {0:.02f} images/s with {1} writer threads'.format(idx / elapsed, args.write_workers))
+
+	# keep the dataset order whatever order the batches come in
+	for filename in test_loader.dataset.img_names:
+		f_result.write(results[filename])
 
 	f_result.close()
 
 	os.rename(os.path.join(result_dir, 'results.csv'), 
 			  os.path.join(result_dir, '%.02f | %.04f.csv'%(PSNR.avg, SSIM.avg)))
 
+	stats = get_bias_cache_stats(network)
+	print('Bias cache: {0} hits, saved {1:.01f} ms in total, {2:.03f} ms per forward'
+		  .format(stats['hits'], stats['saved'] * 1000, stats['saved_per_forward'] * 1000))
+
+	if SEAM.count > 0:
+		print('Seam: PSNR of tiled vs full-frame {seam.avg:.02f} over {seam.count} images'.format(seam=SEAM))
+
 
 if __name__ == '__main__':
 	network = eval(args.model.replace('-', '_'))()
-	network.cuda()
+	network.to(device)
 	saved_model_dir = os.path.join(args.save_dir, args.exp, args.model+'.pth')
 
 	if os.path.exists(saved_model_dir):
 		print('==> Start testing, current model name: ' + args.model)
-		network.load_state_dict(single(saved_model_dir))
+		load_checkpoint(network, saved_model_dir)
+		if args.deploy:
+			network.switch_to_deploy()
+		if args.channels_last:		# after switch_to_deploy, the fused convs are new tensors
+			network.to_channels_last()
 	else:
 		print('==> No existing trained model!')
 		exit(0)
 
 	dataset_dir = os.path.join(args.data_dir, args.dataset)
 	test_dataset = PairLoader(dataset_dir, 'test', 'test')
-	test_loader = DataLoader(test_dataset,
-							 batch_size=1,
-							 num_workers=args.num_workers,
-							 pin_memory=True)
+	if args.batch_size > 1:
+		# test images differ in size, so batches are formed from images of the same size
+		test_loader = DataLoader(test_dataset,
+								 batch_sampler=BucketBatchSampler(test_dataset.get_img_sizes(), args.batch_size),
+								 num_workers=args.num_workers,
+								 pin_memory=device.type == 'cuda')
+	else:
+		test_loader = DataLoader(test_dataset,
+								 batch_size=1,
+								 num_workers=args.num_workers,
+								 pin_memory=device.type == 'cuda')
 
 	result_dir = os.path.join(args.result_dir, args.dataset, args.model)
 	test(test_loader, network, result_dir)
\ No newline at end of file
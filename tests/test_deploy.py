@@ -0,0 +1,43 @@
+import pytest
+import torch
+import torch.nn.functional as F
+from torch.testing import assert_close
+
+from models import msrformer_s, msrformer_l
+from models.msrformer import DEConv
+
+
+def test_deconv_deploy_matches_branches():
+	torch.manual_seed(0)
+	m = DEConv(4).double()
+	for p in m.parameters():		# the biases start at zero
+		torch.nn.init.normal_(p)
+	x = torch.randn(2, 4, 16, 16, dtype=torch.float64)
+
+	# the five branches applied one by one
+	branches = [m.conv1_1.get_weight(), m.conv1_2.get_weight(), m.conv1_3.get_weight(), m.conv1_4.get_weight(),
+				(m.conv1_5.weight, m.conv1_5.bias)]
+	with torch.no_grad():
+		reference = sum(F.conv2d(x, w, b, padding=1) for w, b in branches)
+		out = m(x)
+		m.switch_to_deploy()
+		out_deploy = m(x)
+
+	assert isinstance(m.conv, torch.nn.Conv2d) and not hasattr(m, 'conv1_1')
+	assert_close(out, reference)
+	assert_close(out_deploy, reference)
+
+
+@pytest.mark.parametrize('build', [msrformer_s, msrformer_l])
+def test_model_deploy_matches(build):
+	torch.manual_seed(0)
+	network = build().eval()
+	x = torch.rand(1, 3, 64, 64) * 2 - 1
+
+	with torch.no_grad():
+		out = network(x)
+		network.switch_to_deploy()
+		out_deploy = network(x)
+
+	assert not any(isinstance(m, DEConv) and not m.deploy for m in network.modules())
+	assert_close(out_deploy, out, rtol=1e-4, atol=1e-4)
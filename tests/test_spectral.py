@@ -0,0 +1,112 @@
+import pytest
+import torch
+from torch.testing import assert_close
+
+from models.spectral import patch_fft_correlation, patch_fft_gating, _patch_fft_correlation, _patch_fft_gating, \
+	_patch_dft_correlation, _patch_dft_gating
+
+rearrange = pytest.importorskip('einops').rearrange
+
+
+# the einops code the spectral ops replaced, without the fp32 cast so it can be checked in fp64
+
+def correlation_reference(q, k, patch_size):
+	q_patch = rearrange(q, 'a b (c patch1 patch2) d -> a b c d patch1 patch2', patch1=patch_size, patch2=patch_size)
+	k_patch = rearrange(k, 'a b (c patch1 patch2) d -> a b c d patch1 patch2', patch1=patch_size, patch2=patch_size)
+	out = torch.fft.irfft2(torch.fft.rfft2(q_patch) * torch.fft.rfft2(k_patch), s=(patch_size, patch_size))
+	return rearrange(out, 'a b c d patch1 patch2 -> a b (c patch1 patch2) d', patch1=patch_size, patch2=patch_size)
+
+
+def gating_reference(x, weight, patch_size):
+	x_patch = rearrange(x, 'b c (h patch1) (w patch2) -> b c h w patch1 patch2', patch1=patch_size, patch2=patch_size)
+	x_patch = torch.fft.irfft2(torch.fft.rfft2(x_patch) * weight, s=(patch_size, patch_size))
+	return rearrange(x_patch, 'b c h w patch1 patch2 -> b c (h patch1) (w patch2)', patch1=patch_size, patch2=patch_size)
+
+
+def qk_inputs(patch_size, dtype=torch.float64):
+	# q and k are strided views of the qkv windows, as in WindowAttention
+	qkv = torch.randn(2, 2 * patch_size ** 2, 3, 2, 4, dtype=dtype, requires_grad=True)
+	return qkv, lambda qkv: (qkv.permute(2, 0, 3, 1, 4)[0], qkv.permute(2, 0, 3, 1, 4)[1])
+
+
+def gating_inputs(patch_size, dtype=torch.float64):
+	x = torch.randn(2, 6, 2 * patch_size, 3 * patch_size, dtype=dtype, requires_grad=True)
+	weight = torch.randn(6, 1, 1, patch_size, patch_size // 2 + 1, dtype=dtype, requires_grad=True)
+	return x, weight
+
+
+def check_grads(reference, op, leaves, split, patch_size):
+	leaves_ref = [t.detach().clone().requires_grad_() for t in leaves]
+	out_ref = reference(*split(*leaves_ref), patch_size)
+	out = op(*split(*leaves), patch_size)
+	assert_close(out, out_ref)
+
+	grad = torch.randn_like(out_ref)
+	out_ref.backward(grad)
+	out.backward(grad)
+	for a, b in zip(leaves, leaves_ref):
+		assert_close(a.grad, b.grad)
+
+
+@pytest.mark.parametrize('patch_size', [4, 8])
+def test_correlation_matches_reference(patch_size):
+	qkv, split = qk_inputs(patch_size)
+	check_grads(correlation_reference, patch_fft_correlation, [qkv], split, patch_size)
+
+
+@pytest.mark.parametrize('patch_size', [4, 8])
+def test_gating_matches_reference(patch_size):
+	check_grads(gating_reference, patch_fft_gating, list(gating_inputs(patch_size)), lambda x, w: (x, w), patch_size)
+
+
+def test_fp32_matches_reference():
+	qkv, split = qk_inputs(8, torch.float32)
+	assert_close(patch_fft_correlation(*split(qkv), 8), correlation_reference(*split(qkv), 8), rtol=1e-4, atol=1e-4)
+	x, weight = gating_inputs(8, torch.float32)
+	assert_close(patch_fft_gating(x, weight, 8), gating_reference(x, weight, 8), rtol=1e-4, atol=1e-4)
+
+
+def test_correlation_gradcheck():
+	# the backward recomputes the spectra with _recompute_grad
+	q = torch.randn(1, 2, 32, 3, dtype=torch.float64, requires_grad=True)
+	k = torch.randn(1, 2, 32, 3, dtype=torch.float64, requires_grad=True)
+	assert torch.autograd.gradcheck(lambda q, k: patch_fft_correlation(q, k, 4), (q, k))
+	assert torch.autograd.gradcheck(lambda q: patch_fft_correlation(q, k.detach(), 4), (q,))
+
+
+def test_gating_gradcheck():
+	x = torch.randn(1, 3, 8, 4, dtype=torch.float64, requires_grad=True)
+	weight = torch.randn(3, 1, 1, 4, 3, dtype=torch.float64, requires_grad=True)
+	assert torch.autograd.gradcheck(lambda x, w: patch_fft_gating(x, w, 4), (x, weight))
+	assert torch.autograd.gradcheck(lambda w: patch_fft_gating(x.detach(), w, 4), (weight,))
+
+
+@pytest.mark.parametrize('patch_size', [4, 8])
+def test_dft_fallbacks_match_fft(patch_size):
+	qkv, split = qk_inputs(patch_size)
+	q, k = split(qkv.detach())
+	assert_close(_patch_dft_correlation(q, k, patch_size), _patch_fft_correlation(q, k, patch_size))
+
+	x, weight = gating_inputs(patch_size)
+	x, weight = x.detach(), weight.detach()
+	assert_close(_patch_dft_gating(x, weight, patch_size), _patch_fft_gating(x, weight, patch_size))
+
+
+def test_dft_fallbacks_are_traced():
+	x, weight = gating_inputs(8, torch.float32)
+	x, weight = x.detach(), weight.detach()
+	traced = torch.jit.trace(lambda x: patch_fft_gating(x, weight, 8), x)
+	assert 'fft' not in str(traced.graph)
+	assert_close(traced(x), _patch_fft_gating(x, weight, 8), rtol=1e-4, atol=1e-4)
+
+
+def test_gating_channels_last():
+	x, weight = gating_inputs(8)
+	x_nhwc = x.detach().contiguous(memory_format=torch.channels_last).requires_grad_()
+	out = patch_fft_gating(x_nhwc, weight, 8)
+	assert out.is_contiguous(memory_format=torch.channels_last)
+	assert_close(out, _patch_fft_gating(x.detach(), weight.detach(), 8))
+
+	x = torch.randn(1, 3, 8, 4, dtype=torch.float64).contiguous(memory_format=torch.channels_last).requires_grad_()
+	weight = torch.randn(3, 1, 1, 4, 3, dtype=torch.float64, requires_grad=True)
+	assert torch.autograd.gradcheck(lambda x, w: patch_fft_gating(x, w, 4), (x, weight))
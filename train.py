@@ -1,146 +1,288 @@
-import os
-import argparse
-import json
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-from torch.cuda.amp import autocast, GradScaler
-from torch.utils.data import DataLoader
-from tensorboardX import SummaryWriter
-from tqdm import tqdm
-
-from utils import AverageMeter
-from datasets.loader import PairLoader
-from models import *
-
-
-parser = argparse.ArgumentParser()
-parser.add_argument('--model', default='msrformer-l', type=str, help='model name')
-parser.add_argument('--num_workers', default=16, type=int, help='number of workers')
-parser.add_argument('--no_autocast', action='store_false', default=True, help='disable autocast')
-parser.add_argument('--save_dir', default='saved_models/', type=str, help='path to models saving')
-parser.add_argument('--data_dir', default='data/', type=str, help='path to dataset')
-parser.add_argument('--log_dir', default='logs/', type=str, help='path to logs')
-parser.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
-parser.add_argument('--exp', default='indoor', type=str, help='experiment setting')
-parser.add_argument('--gpu', default='0', type=str, help='GPUs used for training')
-args = parser.parse_args()
-
-os.environ['CUDA_VISIBLE_DEVICES'] = args.gpu
-
-
-def train(train_loader, network, criterion, optimizer, scaler):
-	losses = AverageMeter()
-
-	torch.cuda.empty_cache()
-	
-	network.train()
-
-	for batch in train_loader:
-		source_img = batch['source'].cuda()
-		target_img = batch['target'].cuda()
-
-		with autocast(args.no_autocast):
-			output = network(source_img)
-			loss = criterion(output, target_img)
-
-		losses.update(loss.item())
-
-		optimizer.zero_grad()
-		scaler.scale(loss).backward()
-		scaler.step(optimizer)
-		scaler.update()
-
-	return losses.avg
-
-
-def valid(val_loader, network):
-	PSNR = AverageMeter()
-
-	torch.cuda.empty_cache()
-
-	network.eval()
-
-	for batch in val_loader:
-		source_img = batch['source'].cuda()
-		target_img = batch['target'].cuda()
-
-		with torch.no_grad():							# torch.no_grad() may cause warning
-			output = network(source_img).clamp_(-1, 1)		
-
-		mse_loss = F.mse_loss(output * 0.5 + 0.5, target_img * 0.5 + 0.5, reduction='none').mean((1, 2, 3))
-		psnr = 10 * torch.log10(1 / mse_loss).mean()
-		PSNR.update(psnr.item(), source_img.size(0))
-
-	return PSNR.avg
-
-
-if __name__ == '__main__':
-	setting_filename = os.path.join('configs', args.exp, args.model+'.json')
-	if not os.path.exists(setting_filename):
-		setting_filename = os.path.join('configs', args.exp, 'default.json')
-	with open(setting_filename, 'r') as f:
-		setting = json.load(f)
-
-	network = eval(args.model.replace('-', '_'))()
-	network = nn.DataParallel(network).cuda()
-
-	criterion = nn.L1Loss()
-
-	if setting['optimizer'] == 'adam':
-		optimizer = torch.optim.Adam(network.parameters(), lr=setting['lr'])
-	elif setting['optimizer'] == 'adamw':
-		optimizer = torch.optim.AdamW(network.parameters(), lr=setting['lr'])
-	else:
-		raise Exception("ERROR: unsupported optimizer") 
-
-	scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=setting['epochs'], eta_min=setting['lr'] * 1e-2)
-	scaler = GradScaler()
-
-	dataset_dir = os.path.join(args.data_dir, args.dataset)
-	train_dataset = PairLoader(dataset_dir, 'train', 'train', 
-								setting['patch_size'], setting['edge_decay'], setting['only_h_flip'])
-	train_loader = DataLoader(train_dataset,
-                              batch_size=setting['batch_size'],
-                              shuffle=True,
-                              num_workers=args.num_workers,
-                              pin_memory=True,
-                              drop_last=True)
-	val_dataset = PairLoader(dataset_dir, 'test', setting['valid_mode'], 
-							  setting['patch_size'])
-	val_loader = DataLoader(val_dataset,
-                            batch_size=setting['batch_size'],
-                            num_workers=args.num_workers,
-                            pin_memory=True)
-
-	save_dir = os.path.join(args.save_dir, args.exp)
-	os.makedirs(save_dir, exist_ok=True)
-	if not os.path.exists(os.path.join(save_dir, args.model+'.pth')):
-		print('==> Start training, current model name: ' + args.model)
-		# print(network)
-
-		writer = SummaryWriter(log_dir=os.path.join(args.log_dir, args.exp, args.model))
-
-		best_psnr = 0
-		for epoch in tqdm(range(setting['epochs'] + 1)):
-			loss = train(train_loader, network, criterion, optimizer, scaler)
-
-			writer.add_scalar('train_loss', loss, epoch)
-
-			scheduler.step()
-
-			if epoch % setting['eval_freq'] == 0:
-				avg_psnr = valid(val_loader, network)
-				
-				writer.add_scalar('valid_psnr', avg_psnr, epoch)
-
-				if avg_psnr > best_psnr:
-					best_psnr = avg_psnr
-					torch.save({'state_dict': network.state_dict()},
-                			   os.path.join(save_dir, args.model+'.pth'))
-				
-				writer.add_scalar('best_psnr', best_psnr, epoch)
-
-	else:
-		print('==> Existing trained model')
-		exit(1)
+import os
+import argparse
+import json
+import torch
+import torch.nn as nn
+from torch.cuda.amp import GradScaler
+from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
+from torch.nn.parallel import DistributedDataParallel
+from tensorboardX import SummaryWriter
+from tqdm import tqdm
+
+from utils import set_device
+from utils.metrics import DeviceMeter
+from utils.validation import valid, AsyncValidator
+from utils.distributed import is_distributed, get_world_size, is_main_process, get_local_threads, init_distributed, cleanup_distributed, \
+	get_rank, barrier, all_reduce_mean, all_gather_object
+from utils.profiling import TrainProfiler
+from utils.checkpoint import CheckpointWriter, latest_checkpoint, get_rng_state, restore_rng_state
+from datasets.loader import PairLoader, batch_augment, merge_patches
+from datasets.packed import PackedPairLoader
+from models import *
+from models.msrformer import BasicLayer, Attention, DFFN, CGAFusion, PatchEmbed, PatchUnEmbed
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', default='msrformer-l', type=str, help='model name')
+parser.add_argument('--num_workers', default=16, type=int, help='number of workers')
+parser.add_argument('--no_autocast', action='store_false', default=True, help='disable autocast')
+parser.add_argument('--amp_dtype', default='float16', type=str, help='autocast dtype (float16 on cuda, or bfloat16)')
+parser.add_argument('--save_dir', default='saved_models/', type=str, help='path to models saving')
+parser.add_argument('--data_dir', default='data/', type=str, help='path to dataset')
+parser.add_argument('--log_dir', default='logs/', type=str, help='path to logs')
+parser.add_argument('--dataset', default='RESIDE-IN', type=str, help='dataset name')
+parser.add_argument('--exp', default='indoor', type=str, help='experiment setting')
+parser.add_argument('--gpu', default='0', type=str, help='GPUs used for training')
+parser.add_argument('--device', default='cuda', type=str, help='device used for training (cuda or cpu)')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+parser.add_argument('--num_interop_threads', default=0, type=int, help='inter-op threads on cpu, 0 for default')
+parser.add_argument('--async_valid', action='store_true', default=False, help='validate in a background process')
+parser.add_argument('--valid_workers', default=0, type=int, help='data loading workers of the background validation')
+parser.add_argument('--valid_threads', default=0, type=int, help='cpu threads of the background validation, 0 for default')
+parser.add_argument('--resume', action='store_true', default=False, help='resume from the latest checkpoint')
+parser.add_argument('--ckpt_freq', default=1, type=int, help='epochs between full checkpoints, 0 to disable')
+parser.add_argument('--keep_ckpts', default=3, type=int, help='number of full checkpoints kept, 0 keeps all')
+parser.add_argument('--dist_backend', default='', type=str, help='backend of torchrun launches, nccl on cuda and gloo on cpu by default')
+parser.add_argument('--dist_timeout', default=60, type=int, help='minutes the other ranks wait for the validation on rank 0')
+parser.add_argument('--profile', action='store_true', default=False, help='log per-module, data wait and memory telemetry')
+parser.add_argument('--trace_dir', default='', type=str, help='with --profile, write a chrome trace of a few steps here')
+parser.add_argument('--trace_start', default=10, type=int, help='first traced step')
+parser.add_argument('--trace_steps', default=5, type=int, help='number of traced steps')
+parser.add_argument('--channels_last', action='store_true', default=False, help='run the convs on NHWC-strided tensors')
+
+
+def train(train_loader, network, criterion, optimizer, scaler, device, amp_dtype, use_autocast, profiler=None):
+	losses = DeviceMeter()		# no sync per step, read once per epoch
+
+	if device.type == 'cuda':
+		torch.cuda.empty_cache()
+	
+	network.train()
+
+	if profiler is not None:
+		profiler.epoch_begin()
+
+	for batch in train_loader:
+		if profiler is not None:
+			profiler.step_begin()
+
+		batch = merge_patches(batch)
+		if 'h_flip' in batch:		# uint8 crops, augmented and scaled on the training device
+			source_img, target_img = batch_augment(batch, device)
+		else:
+			source_img = batch['source'].to(device, non_blocking=True)
+			target_img = batch['target'].to(device, non_blocking=True)
+
+		with torch.autocast(device.type, dtype=amp_dtype, enabled=use_autocast):
+			output = network(source_img)
+			loss = criterion(output, target_img)
+
+		losses.update(loss)
+
+		optimizer.zero_grad()
+		scaler.scale(loss).backward()
+		scaler.step(optimizer)
+		scaler.update()
+
+		if profiler is not None:
+			profiler.step_end(source_img.size(0))
+
+	return losses.avg
+
+
+def report_valid(writer, ckpt_writer, results, best_psnr, save_path):
+	# results are (epoch, psnr, state_dict) in epoch order, they may arrive epochs late
+	for epoch, avg_psnr, state_dict in results:
+		writer.add_scalar('valid_psnr', avg_psnr, epoch)
+
+		if avg_psnr > best_psnr:
+			best_psnr = avg_psnr
+			ckpt_writer.save({'state_dict': state_dict}, save_path)
+
+		writer.add_scalar('best_psnr', best_psnr, epoch)
+
+	return best_psnr
+
+
+if __name__ == '__main__':
+	# parsed here, the spawned validation process re-imports this file and must not join the process group
+	args = parser.parse_args()
+
+	# under torchrun every rank is a process, LOCAL_RANK indexes the GPUs listed in --gpu
+	os.environ['CUDA_VISIBLE_DEVICES'] = args.gpu
+	num_threads = args.num_threads if args.num_threads > 0 or not is_distributed() else get_local_threads()
+	device = init_distributed(set_device(args.device, num_threads, args.num_interop_threads), args.dist_backend, args.dist_timeout)
+
+	# fp16 autocast is only supported on cuda, bf16 runs on both cuda and cpu
+	amp_dtype = getattr(torch, args.amp_dtype)
+	use_autocast = args.no_autocast and (device.type == 'cuda' or amp_dtype == torch.bfloat16)
+
+	setting_filename = os.path.join('configs', args.exp, args.model+'.json')
+	if not os.path.exists(setting_filename):
+		setting_filename = os.path.join('configs', args.exp, 'default.json')
+	with open(setting_filename, 'r') as f:
+		setting = json.load(f)
+
+	model = eval(args.model.replace('-', '_'))()
+	model.set_checkpointing(setting.get('checkpoint_blocks', [0, 0, 0, 0, 0]))		# trades recompute for memory
+	if args.channels_last:
+		model.to_channels_last()
+	if is_distributed():
+		model = model.to(device)
+		# blocks without attention skip their DEB branch, so not every parameter gets a gradient
+		network = DistributedDataParallel(model, device_ids=[device.index] if device.type == 'cuda' else None,
+										  find_unused_parameters=True)
+	elif device.type == 'cuda':
+		network = nn.DataParallel(model).cuda()
+	else:
+		network = model = model.to(device)
+
+	criterion = nn.L1Loss()
+
+	if setting['optimizer'] == 'adam':
+		optimizer = torch.optim.Adam(network.parameters(), lr=setting['lr'])
+	elif setting['optimizer'] == 'adamw':
+		optimizer = torch.optim.AdamW(network.parameters(), lr=setting['lr'])
+	else:
+		raise Exception("ERROR: unsupported optimizer") 
+
+	scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=setting['epochs'], eta_min=setting['lr'] * 1e-2)
+	scaler = GradScaler(enabled=use_autocast and amp_dtype == torch.float16)	# bf16 needs no loss scaling
+
+	# 'packed' reads the uint8 store written by pack_dataset.py instead of decoding PNGs
+	Loader = PackedPairLoader if setting.get('data_backend', 'png') == 'packed' else PairLoader
+
+	# batch_size in the configs is the global batch, each rank loads its share
+	world_size = get_world_size()
+	if setting['batch_size'] % world_size != 0:
+		raise Exception("ERROR: batch_size %d is not divisible by %d processes" % (setting['batch_size'], world_size))
+
+	dataset_dir = os.path.join(args.data_dir, args.dataset)
+	train_dataset = Loader(dataset_dir, 'train', 'train', 
+							setting['patch_size'], setting['edge_decay'], setting['only_h_flip'],
+							setting.get('uint8_transfer', False), setting.get('patches_per_image', 1))
+	train_sampler = DistributedSampler(train_dataset, shuffle=True, drop_last=True) if is_distributed() else None
+	train_loader = DataLoader(train_dataset,
+                              batch_size=setting['batch_size'] // world_size,
+                              shuffle=train_sampler is None,
+                              sampler=train_sampler,
+                              num_workers=args.num_workers,
+                              pin_memory=device.type == 'cuda',
+                              drop_last=True)
+	val_dataset = Loader(dataset_dir, 'test', setting['valid_mode'], 
+						  setting['patch_size'])
+	val_loader = DataLoader(val_dataset,
+                            batch_size=setting['batch_size'],
+                            num_workers=args.num_workers,
+                            pin_memory=device.type == 'cuda')
+
+	save_dir = os.path.join(args.save_dir, args.exp)
+	os.makedirs(save_dir, exist_ok=True)
+	save_path = os.path.join(save_dir, args.model+'.pth')
+	if args.resume or not os.path.exists(save_path):
+		# logging, validation and checkpointing happen on rank 0 only
+		main_process = is_main_process()
+		if main_process:
+			print('==> Start training, current model name: ' + args.model)
+		# print(network)
+
+		# full training state, serialized and written atomically on a background thread
+		ckpt_dir = os.path.join(save_dir, args.model+'_ckpt')
+		ckpt_writer = CheckpointWriter(ckpt_dir, args.keep_ckpts) if main_process else None
+
+		start_epoch, best_psnr = 0, 0
+		ckpt_path = latest_checkpoint(ckpt_dir) if args.resume else None
+		if ckpt_path is not None:
+			print('==> Resume from ' + ckpt_path)
+			# full training state of our own, the rng states hold numpy arrays that weights_only rejects
+			checkpoint = torch.load(ckpt_path, map_location='cpu', weights_only=False)
+			model.load_state_dict(checkpoint['state_dict'])
+			optimizer.load_state_dict(checkpoint['optimizer'])
+			scheduler.load_state_dict(checkpoint['scheduler'])
+			scaler.load_state_dict(checkpoint['scaler'])
+			restore_rng_state(checkpoint['rng_state'], get_rank())
+			start_epoch, best_psnr = checkpoint['epoch'] + 1, checkpoint['best_psnr']
+
+		if main_process:
+			writer = SummaryWriter(log_dir=os.path.join(args.log_dir, args.exp, args.model))
+
+		# hooks sync the device at every module boundary, so this is off by default
+		profiler = None
+		if args.profile and main_process:
+			profiled = (BasicLayer, Attention, DFFN, CGAFusion, PatchEmbed, PatchUnEmbed)
+			profiler = TrainProfiler([(type(m).__name__, m) for m in model.modules() if isinstance(m, profiled)],
+									 device.type == 'cuda', args.trace_dir, args.trace_start, args.trace_steps)
+
+		# validate weight snapshots in another process, training does not wait for them
+		validator = None
+		if args.async_valid and main_process:
+			validator = AsyncValidator(eval(args.model.replace('-', '_')), val_dataset, setting['batch_size'],
+									   device, args.valid_workers, args.valid_threads)
+
+		# an exception must not leave the validation process or the writer thread behind
+		try:
+			for epoch in tqdm(range(start_epoch, setting['epochs'] + 1), disable=not main_process):
+				if train_sampler is not None:
+					train_sampler.set_epoch(epoch)
+
+				loss = train(train_loader, network, criterion, optimizer, scaler, device, amp_dtype, use_autocast, profiler)
+				loss = all_reduce_mean(loss, device)
+
+				scheduler.step()
+
+				# every rank draws its own augmentations, so the rng states of all ranks are saved
+				save_ckpt = args.ckpt_freq > 0 and (epoch % args.ckpt_freq == 0 or epoch == setting['epochs'])
+				rng_states = all_gather_object(get_rng_state()) if save_ckpt else None
+
+				if not main_process:
+					barrier()		# waits for the validation and checkpoint of rank 0
+					continue
+
+				writer.add_scalar('train_loss', loss, epoch)
+				if profiler is not None:
+					profiler.report(writer, epoch)
+
+				results = []
+				if epoch % setting['eval_freq'] == 0:
+					if validator is not None:
+						validator.submit(epoch, model)
+					else:
+						if profiler is not None:
+							profiler.pause()
+						# DDP would broadcast buffers from rank 0 alone, so the module is validated directly
+						results = [(epoch, valid(val_loader, model if is_distributed() else network, device), network.state_dict())]
+						if profiler is not None:
+							profiler.resume()
+
+				if validator is not None:
+					results = validator.poll()
+
+				best_psnr = report_valid(writer, ckpt_writer, results, best_psnr, save_path)
+
+				if save_ckpt:
+					ckpt_writer.save_epoch({'epoch': epoch,
+											'state_dict': model.state_dict(),
+											'optimizer': optimizer.state_dict(),
+											'scheduler': scheduler.state_dict(),
+											'scaler': scaler.state_dict(),
+											'best_psnr': best_psnr,
+											'rng_state': rng_states}, epoch)
+
+				barrier()
+
+			if validator is not None:
+				best_psnr = report_valid(writer, ckpt_writer, validator.close(), best_psnr, save_path)
+		finally:
+			if validator is not None:
+				validator.terminate()
+			if ckpt_writer is not None:
+				ckpt_writer.close()
+			if profiler is not None:
+				profiler.close()
+
+		cleanup_distributed()
+
+	else:
+		print('==> Existing trained model')
+		exit(1)
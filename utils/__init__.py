@@ -1,2 +1,2 @@
-from .common import AverageMeter, ListAverageMeter, read_img, write_img, hwc_to_chw, chw_to_hwc
+from .common import AverageMeter, ListAverageMeter, read_img, read_img_uint8, read_img_size, read_img_shape, write_img, hwc_to_chw, chw_to_hwc, set_device, load_checkpoint
 from .data_parallel import BalancedDataParallel
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import re
+import random
+import threading
+from collections import deque
+import numpy as np
+import torch
+
+
+def to_cpu(obj):
+	# copies every tensor, the training step may overwrite the originals in place
+	if torch.is_tensor(obj):
+		return obj.detach().to('cpu', copy=True)
+	if isinstance(obj, dict):
+		return type(obj)((k, to_cpu(v)) for k, v in obj.items())
+	if isinstance(obj, (list, tuple)):
+		return type(obj)(to_cpu(v) for v in obj)
+	return obj
+
+
+def get_rng_state():
+	state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+	if torch.cuda.is_available():
+		state['cuda'] = torch.cuda.get_rng_state_all()
+	return state
+
+
+def set_rng_state(state):
+	random.setstate(state['python'])
+	np.random.set_state(state['numpy'])
+	torch.set_rng_state(state['torch'])
+	if 'cuda' in state and torch.cuda.is_available() and len(state['cuda']) == torch.cuda.device_count():
+		torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def restore_rng_state(states, rank=0):
+	"""Restores the rng state of this rank, states is a list with one state per rank"""
+	if not isinstance(states, list):
+		states = [states]		# older checkpoints kept the state of rank 0 only
+
+	if rank < len(states):
+		set_rng_state(states[rank])
+		return
+
+	# no saved state for this rank, derive a seed of its own so the augmentation differs between ranks
+	set_rng_state(states[0])
+	seed = (int(torch.randint(2 ** 31, ()).item()) + rank) % 2 ** 32
+	random.seed(seed)
+	np.random.seed(seed)
+	torch.manual_seed(seed)
+
+
+def save_atomic(state, filename):
+	# a crash while writing leaves the previous file intact
+	tmp_filename = filename + '.tmp'
+	with open(tmp_filename, 'wb') as f:
+		torch.save(state, f)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp_filename, filename)
+
+
+def list_checkpoints(ckpt_dir):
+	"""Returns the periodic checkpoints of ckpt_dir, oldest first"""
+	if not os.path.isdir(ckpt_dir):
+		return []
+	names = [name for name in os.listdir(ckpt_dir) if re.fullmatch(r'epoch_\d+\.pth', name)]
+	return [os.path.join(ckpt_dir, name) for name in sorted(names)]
+
+
+def latest_checkpoint(ckpt_dir):
+	checkpoints = list_checkpoints(ckpt_dir)
+	return checkpoints[-1] if checkpoints else None
+
+
+class CheckpointWriter(object):
+	"""Writes checkpoints on a background thread, the caller only pays for the copy to cpu"""
+	def __init__(self, ckpt_dir, keep=3):
+		self.ckpt_dir = ckpt_dir
+		self.keep = keep
+		os.makedirs(ckpt_dir, exist_ok=True)
+
+		self.pending = deque()			# (state, filename, prune) not written yet
+		self.cond = threading.Condition()
+		self.closed = False
+		self.dropped = 0				# periodic states superseded before they were written
+		self.error = None
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def run(self):
+		while True:
+			with self.cond:
+				while not self.pending and not self.closed:
+					self.cond.wait()
+				if not self.pending:
+					break
+				state, filename, prune = self.pending.popleft()
+
+			try:
+				if self.error is None:
+					save_atomic(state, filename)
+					if prune:
+						self.prune()
+			except Exception as e:
+				self.error = e
+
+	def prune(self):
+		# keeps the newest self.keep periodic checkpoints, 0 keeps all
+		if self.keep > 0:
+			for filename in list_checkpoints(self.ckpt_dir)[:-self.keep]:
+				os.remove(filename)
+
+	def check(self):
+		if self.error is not None:
+			raise RuntimeError('writing checkpoint failed') from self.error
+
+	def save(self, state, filename, prune=False):
+		# never blocks on the disk: a newer state replaces a waiting one of the same file,
+		# and a periodic checkpoint replaces the older periodic ones still waiting
+		self.check()
+		state = to_cpu(state)
+		with self.cond:
+			kept = deque(task for task in self.pending if task[1] != filename and not (prune and task[2]))
+			self.dropped += len(self.pending) - len(kept)
+			kept.append((state, filename, prune))
+			self.pending = kept
+			self.cond.notify()
+
+	def save_epoch(self, state, epoch):
+		self.save(state, os.path.join(self.ckpt_dir, 'epoch_%04d.pth' % epoch), prune=True)
+
+	def close(self):
+		# writes what is still pending, can be called more than once
+		with self.cond:
+			self.closed = True
+			self.cond.notify()
+		self.thread.join()
+		self.check()
@@ -1,5 +1,8 @@
+import os
 import numpy as np
 import cv2
+import torch
+from collections import OrderedDict
 
 
 class AverageMeter(object):
@@ -26,9 +29,9 @@ class ListAverageMeter(object):
 		self.reset()
 
 	def reset(self):
-		self.val = [0] * self.len
-		self.avg = [0] * self.len
-		self.sum = [0] * self.len
+		self.val = np.zeros(self.len)
+		self.avg = np.zeros(self.len)
+		self.sum = np.zeros(self.len)
 		self.count = 0
 
 	def set_len(self, n):
@@ -37,12 +40,10 @@ class ListAverageMeter(object):
 
 	def update(self, vals, n=1):
 		assert len(vals) == self.len, 'length of vals not equal to self.len'
-		self.val = vals
-		for i in range(self.len):
-			self.sum[i] += self.val[i] * n
+		self.val = np.asarray(vals, dtype=np.float64)
+		self.sum += self.val * n
 		self.count += n
-		for i in range(self.len):
-			self.avg[i] = self.sum[i] / self.count
+		self.avg = self.sum / self.count
 			
 
 def read_img(filename):
@@ -50,6 +51,26 @@ def read_img(filename):
 	return img[:, :, ::-1].astype('float32') / 255.0
 
 
+def read_img_uint8(filename):
+	img = cv2.imread(filename)
+	return img[:, :, ::-1]
+
+
+def read_img_shape(filename):
+	# PNG stores the size and color type in the IHDR chunk, other formats are decoded
+	with open(filename, 'rb') as f:
+		header = f.read(26)
+	if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+		channels = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}[header[25]]
+		return int.from_bytes(header[20:24], 'big'), int.from_bytes(header[16:20], 'big'), channels
+	img = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+	return img.shape[0], img.shape[1], img.shape[2] if img.ndim == 3 else 1
+
+
+def read_img_size(filename):
+	return read_img_shape(filename)[:2]
+
+
 def write_img(filename, img):
 	img = np.round((img[:, :, ::-1].copy() * 255.0)).astype('uint8')
 	cv2.imwrite(filename, img)
@@ -61,3 +82,34 @@ def hwc_to_chw(img):
 
 def chw_to_hwc(img):
 	return np.transpose(img, axes=[1, 2, 0]).copy()
+
+
+def set_device(name, num_threads=0, num_interop_threads=0):
+	device = torch.device(name)
+
+	if device.type == 'cuda' and not torch.cuda.is_available():
+		raise Exception("ERROR: CUDA is not available, use --device cpu")
+
+	if device.type == 'cpu':
+		# one intra-op thread per usable core, the network is a sequential stack
+		# so a single inter-op thread avoids oversubscribing the cores
+		cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+		torch.set_num_threads(num_threads if num_threads > 0 else cores)
+		torch.set_num_interop_threads(num_interop_threads if num_interop_threads > 0 else 1)
+
+	return device
+
+
+def load_checkpoint(network, save_dir):
+	checkpoint = torch.load(save_dir, map_location='cpu')
+	state_dict = checkpoint['state_dict']
+	new_state_dict = OrderedDict()
+
+	for k, v in state_dict.items():
+		name = k[7:] if k.startswith('module.') else k		# models trained on cpu are not wrapped
+		new_state_dict[name] = v
+
+	if checkpoint.get('deploy', False):		# checkpoint saved after switch_to_deploy()
+		network.switch_to_deploy()
+	network.load_state_dict(new_state_dict)
+	return network
@@ -13,11 +13,9 @@ def scatter(inputs, target_gpus, chunk_sizes, dim=0):
         if isinstance(obj, torch.Tensor):
             try:
                 return Scatter.apply(target_gpus, chunk_sizes, dim, obj)
-            except:
-                print('obj', obj.size())
-                print('dim', dim)
-                print('chunk_sizes', chunk_sizes)
-                quit()
+            except Exception as e:
+                raise RuntimeError('cannot scatter a tensor of size {} along dim {} in chunks {}'
+                                   .format(tuple(obj.size()), dim, chunk_sizes)) from e
         if isinstance(obj, tuple) and len(obj) > 0:
             return list(zip(*map(scatter_map, obj)))
         if isinstance(obj, list) and len(obj) > 0:
@@ -0,0 +1,69 @@
+import os
+from datetime import timedelta
+import torch
+import torch.distributed as dist
+
+
+def is_distributed():
+	# set by torchrun for every rank
+	return int(os.environ.get('WORLD_SIZE', 1)) > 1
+
+
+def get_world_size():
+	return dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+
+
+def get_rank():
+	return dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+
+
+def is_main_process():
+	return get_rank() == 0
+
+
+def get_local_threads():
+	# cores are split between the ranks of a node
+	cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+	return max(1, cores // int(os.environ.get('LOCAL_WORLD_SIZE', 1)))
+
+
+def init_distributed(device, backend='', timeout=30):
+	"""Joins the process group of a torchrun launch, returns the device of this rank"""
+	if not is_distributed():
+		return device
+
+	if device.type == 'cuda':
+		device = torch.device('cuda', int(os.environ['LOCAL_RANK']))
+		torch.cuda.set_device(device)
+
+	# timeout in minutes, ranks wait that long at a collective while rank 0 validates
+	dist.init_process_group(backend or ('nccl' if device.type == 'cuda' else 'gloo'), timeout=timedelta(minutes=timeout))
+	return device
+
+
+def barrier():
+	if dist.is_available() and dist.is_initialized():
+		dist.barrier()
+
+
+def all_reduce_mean(value, device):
+	# mean of a python number over the ranks
+	if not (dist.is_available() and dist.is_initialized()):
+		return value
+	tensor = torch.tensor(value, dtype=torch.float64, device=device)
+	dist.all_reduce(tensor)
+	return tensor.item() / dist.get_world_size()
+
+
+def all_gather_object(obj):
+	# list with the obj of every rank, in rank order
+	if not (dist.is_available() and dist.is_initialized()):
+		return [obj]
+	objs = [None] * dist.get_world_size()
+	dist.all_gather_object(objs, obj)
+	return objs
+
+
+def cleanup_distributed():
+	if dist.is_available() and dist.is_initialized():
+		dist.destroy_process_group()
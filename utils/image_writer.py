@@ -0,0 +1,47 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import write_img, chw_to_hwc
+
+
+def write_chw_img(filename, img):
+	write_img(filename, chw_to_hwc(img))
+
+
+class ImageWriter(object):
+	"""Converts and encodes CHW images on a pool of threads, cv2 releases the GIL while encoding"""
+	def __init__(self, num_workers=4, max_pending=16):
+		self.pool = ThreadPoolExecutor(num_workers) if num_workers > 0 else None
+		self.slots = threading.BoundedSemaphore(max_pending)		# images held in memory
+		self.futures = []
+
+	def write(self, filename, img):
+		if self.pool is None:
+			write_chw_img(filename, img)
+			return
+
+		self.check()
+		self.slots.acquire()		# waits for the writers when they fall behind
+		future = self.pool.submit(write_chw_img, filename, img)
+		future.add_done_callback(lambda _: self.slots.release())
+		self.futures.append(future)
+
+	def check(self):
+		# raises the first error of the finished writes
+		pending = []
+		for future in self.futures:
+			if future.done():
+				future.result()
+			else:
+				pending.append(future)
+		self.futures = pending
+
+	def close(self):
+		if self.pool is None:
+			return
+		try:
+			for future in self.futures:
+				future.result()
+		finally:
+			self.futures = []
+			self.pool.shutdown(wait=True)
@@ -0,0 +1,46 @@
+import torch
+import torch.nn.functional as F
+from pytorch_msssim import ssim
+
+
+def psnr(output, target):
+	"""Per-image PSNR of a batch of [0, 1] images"""
+	return 10 * torch.log10(1 / F.mse_loss(output, target, reduction='none').mean((1, 2, 3)))
+
+
+def downsampled_ssim(output, target):
+	"""Per-image SSIM of a batch of same-size [0, 1] images, computed at about 256 pixels on the short side"""
+	_, _, H, W = output.size()
+	down_ratio = max(1, round(min(H, W) / 256))		# Zhou Wang
+	size = (int(H / down_ratio), int(W / down_ratio))
+	return ssim(F.adaptive_avg_pool2d(output, size), F.adaptive_avg_pool2d(target, size),
+				data_range=1, size_average=False)
+
+
+class DeviceMeter(object):
+	"""Keeps the running sum on the device of the values, only avg and sum read it back"""
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.total = None
+		self.count = 0
+
+	def update(self, vals, n=1):
+		# a scalar weighted by n, or a tensor of per-sample values
+		vals = vals.detach().double()
+		if vals.dim() == 0:
+			vals, n = vals * n, n
+		else:
+			vals, n = vals.sum(), vals.numel()
+
+		self.total = vals if self.total is None else self.total + vals
+		self.count += n
+
+	@property
+	def sum(self):
+		return self.total.item() if self.total is not None else 0
+
+	@property
+	def avg(self):
+		return self.sum / self.count if self.count > 0 else 0
@@ -0,0 +1,177 @@
+import os
+import time
+import resource
+from collections import defaultdict
+from functools import partial
+import torch
+
+
+def in_backward():
+	# forwards re-run by activation checkpointing happen inside the backward pass
+	graph_task_id = getattr(torch._C, '_current_graph_task_id', None)
+	return graph_task_id is not None and graph_task_id() != -1
+
+
+class ModuleTimer(object):
+	"""Accumulates forward/backward time of modules with hooks, modules sharing a label are summed"""
+	def __init__(self, modules, sync=False, track_memory=False):
+		# modules is a list of (label, module), sync waits for cuda kernels at every hook
+		self.sync = sync and torch.cuda.is_available()
+		self.track_memory = track_memory and torch.cuda.is_available()
+		self.handles = []
+		self.stack = []			# labels of the modules in forward, for pack()
+		self.start = {}
+		self.enabled = True		# cleared to leave out forwards that are not training steps
+		self.reset()
+
+		for label, module in modules:
+			self.handles.append(module.register_forward_pre_hook(partial(self.forward_pre, label)))
+			self.handles.append(module.register_forward_hook(partial(self.forward_post, label)))
+			if hasattr(module, 'register_full_backward_pre_hook'):		# torch >= 2.0
+				self.handles.append(module.register_full_backward_pre_hook(partial(self.backward_pre, label)))
+				self.handles.append(module.register_full_backward_hook(partial(self.backward_post, label)))
+
+	def reset(self):
+		self.forward = defaultdict(float)		# seconds
+		self.backward = defaultdict(float)
+		self.recompute = defaultdict(float)		# forwards re-run in backward by checkpointing
+		self.calls = defaultdict(int)
+		self.peak = defaultdict(int)			# bytes above the allocation at entry, cuda only
+		self.saved = defaultdict(int)			# bytes saved for backward inside the module
+
+	def now(self):
+		if self.sync:
+			torch.cuda.synchronize()
+		return time.perf_counter()
+
+	def forward_pre(self, label, module, inputs):
+		if not self.enabled:
+			return
+		self.stack.append(label)
+		if self.track_memory:
+			torch.cuda.reset_peak_memory_stats()
+			self.start[('memory', id(module))] = torch.cuda.memory_allocated()
+		self.start[('forward', id(module))] = self.now()
+
+	def forward_post(self, label, module, inputs, output):
+		start = self.start.pop(('forward', id(module)), None)
+		if start is None:		# the pre hook ran while disabled
+			return
+		if in_backward():
+			self.recompute[label] += self.now() - start
+		else:
+			self.forward[label] += self.now() - start
+			self.calls[label] += 1
+		if self.track_memory:
+			base = self.start.pop(('memory', id(module)))
+			if not in_backward():
+				self.peak[label] = max(self.peak[label], torch.cuda.max_memory_allocated() - base)
+		self.stack.pop()
+
+	def backward_pre(self, label, module, grad_output):
+		if self.enabled:
+			self.start[('backward', id(module))] = self.now()
+
+	def backward_post(self, label, module, grad_input, grad_output):
+		# not called for modules whose inputs do not require grad
+		start = self.start.pop(('backward', id(module)), None)
+		if start is not None:
+			self.backward[label] += self.now() - start
+
+	def pack(self, t):
+		# use as torch.autograd.graph.saved_tensors_hooks(timer.pack, lambda t: t)
+		if self.stack:
+			self.saved[self.stack[-1]] += t.numel() * t.element_size()
+		return t
+
+	def close(self):
+		for handle in self.handles:
+			handle.remove()
+		self.handles = []
+
+
+class TrainProfiler(object):
+	"""Opt-in telemetry of the training loop, written as tensorboard scalars once per epoch"""
+	def __init__(self, modules, sync=False, trace_dir='', trace_start=10, trace_steps=5):
+		# sync waits for the cuda kernels, so step and module times are not just launch times
+		self.timer = ModuleTimer(modules, sync=sync)
+		self.sync = sync and torch.cuda.is_available()
+		self.reset()
+
+		# chrome trace of a window of steps in the first profiled epoch
+		self.trace = None
+		if trace_dir:
+			os.makedirs(trace_dir, exist_ok=True)
+			activities = [torch.profiler.ProfilerActivity.CPU]
+			if torch.cuda.is_available():
+				activities.append(torch.profiler.ProfilerActivity.CUDA)
+			self.trace = torch.profiler.profile(
+				activities=activities,
+				schedule=torch.profiler.schedule(wait=max(0, trace_start - 1), warmup=1, active=trace_steps, repeat=1),
+				on_trace_ready=lambda p: p.export_chrome_trace(os.path.join(trace_dir, 'trace_%d.json' % p.step_num)),
+				record_shapes=True)
+			self.trace.start()
+
+	def reset(self):
+		self.timer.reset()
+		self.data_wait = 0.
+		self.compute = 0.
+		self.steps = 0
+		self.samples = 0
+		if torch.cuda.is_available():
+			torch.cuda.reset_peak_memory_stats()
+
+	def now(self):
+		if self.sync:
+			torch.cuda.synchronize()
+		return time.perf_counter()
+
+	def epoch_begin(self):
+		self.mark = self.now()
+
+	def pause(self):
+		# validation forwards are not counted
+		self.timer.enabled = False
+
+	def resume(self):
+		self.timer.enabled = True
+
+	def step_begin(self):
+		# the time since the end of the last step was spent waiting for the loader
+		now = self.now()
+		self.data_wait += now - self.mark
+		self.mark = now
+
+	def step_end(self, batch_size):
+		now = self.now()
+		self.compute += now - self.mark
+		self.mark = now
+		self.steps += 1
+		self.samples += batch_size
+
+		if self.trace is not None:
+			self.trace.step()
+
+	def report(self, writer, epoch):
+		steps = max(1, self.steps)
+		writer.add_scalar('profile/data_wait_ms', self.data_wait / steps * 1000, epoch)
+		writer.add_scalar('profile/compute_ms', self.compute / steps * 1000, epoch)
+		writer.add_scalar('profile/samples_per_sec', self.samples / max(1e-9, self.data_wait + self.compute), epoch)
+		if torch.cuda.is_available():
+			writer.add_scalar('profile/peak_memory_mb', torch.cuda.max_memory_allocated() / 2**20, epoch)
+		writer.add_scalar('profile/max_rss_mb', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, epoch)
+
+		# nested modules are timed on their own, a BasicLayer includes its Attention and DFFN
+		for label in self.timer.calls:
+			writer.add_scalar('profile/forward_ms/' + label, self.timer.forward[label] / steps * 1000, epoch)
+			writer.add_scalar('profile/backward_ms/' + label, self.timer.backward[label] / steps * 1000, epoch)
+			if label in self.timer.recompute:
+				writer.add_scalar('profile/recompute_ms/' + label, self.timer.recompute[label] / steps * 1000, epoch)
+
+		self.reset()
+
+	def close(self):
+		self.timer.close()
+		if self.trace is not None:
+			self.trace.stop()
+			self.trace = None
@@ -0,0 +1,34 @@
+import numpy as np
+import torch
+
+
+class TorchRunner(object):
+	"""Runs an nn.Module or a TorchScript module on NCHW float32 arrays in [-1, 1]"""
+	def __init__(self, network, device):
+		self.network = network.eval()
+		self.device = device
+
+	def __call__(self, x):
+		with torch.no_grad():
+			output = self.network(torch.from_numpy(x).to(self.device))
+		return output.clamp_(-1, 1).float().cpu().numpy()
+
+
+class OnnxRunner(object):
+	"""Runs an exported ONNX graph with ONNX Runtime on the CPU, no model code is needed"""
+	def __init__(self, filename, num_threads=0):
+		import onnxruntime as ort		# only needed for this backend
+
+		options = ort.SessionOptions()
+		options.intra_op_num_threads = num_threads
+		options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+		self.session = ort.InferenceSession(filename, options, providers=['CPUExecutionProvider'])
+		self.input_name = self.session.get_inputs()[0].name
+
+	def __call__(self, x):
+		output = self.session.run(None, {self.input_name: np.ascontiguousarray(x, dtype=np.float32)})[0]
+		return np.clip(output, -1, 1)
+
+
+def load_torchscript(filename, device):
+	return TorchRunner(torch.jit.load(filename, map_location=device), device)
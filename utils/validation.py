@@ -0,0 +1,123 @@
+import queue
+import traceback
+import torch
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader
+
+from .metrics import psnr, DeviceMeter
+
+
+def valid(val_loader, network, device):
+	PSNR = DeviceMeter()
+
+	if device.type == 'cuda':
+		torch.cuda.empty_cache()
+
+	network.eval()
+
+	for batch in val_loader:
+		source_img = batch['source'].to(device, non_blocking=True)
+		target_img = batch['target'].to(device, non_blocking=True)
+
+		with torch.no_grad():							# torch.no_grad() may cause warning
+			output = network(source_img).clamp_(-1, 1)
+
+		PSNR.update(psnr(output * 0.5 + 0.5, target_img * 0.5 + 0.5))
+
+	return PSNR.avg		# the only sync of the validation
+
+
+def valid_worker(build_network, val_dataset, batch_size, num_workers, device, num_threads, tasks, results):
+	if num_threads > 0:
+		torch.set_num_threads(num_threads)
+
+	network = build_network().to(device)
+	val_loader = DataLoader(val_dataset,
+							batch_size=batch_size,
+							num_workers=num_workers,
+							pin_memory=device.type == 'cuda')
+
+	while True:
+		task = tasks.get()
+		if task is None:
+			break
+
+		epoch, state_dict = task
+		try:
+			network.load_state_dict(state_dict)
+			results.put((epoch, valid(val_loader, network, device), None))
+		except Exception:
+			results.put((epoch, None, traceback.format_exc()))
+
+
+class AsyncValidator(object):
+	"""Validates weight snapshots in a separate process while training continues"""
+	def __init__(self, build_network, val_dataset, batch_size, device, num_workers=0, num_threads=0, max_pending=2):
+		ctx = mp.get_context('spawn')		# cuda cannot be re-initialized in a forked process
+		self.tasks = ctx.Queue()
+		self.results = ctx.Queue()
+		self.process = ctx.Process(target=valid_worker,
+								   args=(build_network, val_dataset, batch_size, num_workers, device, num_threads,
+										 self.tasks, self.results))
+		self.process.start()
+
+		self.max_pending = max_pending
+		self.pending = {}		# epoch -> snapshot, kept until its result is reported
+		self.order = []			# submitted epochs, results are released in this order
+		self.done = {}
+
+	def submit(self, epoch, network):
+		# bounded number of snapshots in flight, wait for the oldest one if needed
+		while len(self.order) - len(self.done) >= self.max_pending:
+			self.collect(block=True)
+
+		snapshot = {k: v.detach().to('cpu', copy=True) for k, v in network.state_dict().items()}
+		self.pending[epoch] = snapshot
+		self.order.append(epoch)
+		self.tasks.put((epoch, snapshot))
+
+	def collect(self, block=False):
+		# moves finished results into self.done, waits for at least one if block
+		while True:
+			try:
+				epoch, psnr, error = self.results.get(block=block, timeout=1)
+			except queue.Empty:
+				if not block:
+					return
+				if not self.process.is_alive():
+					raise RuntimeError('validation worker exited unexpectedly')
+				continue
+
+			if error is not None:
+				raise RuntimeError('validation of epoch %d failed:\n%s' % (epoch, error))
+			self.done[epoch] = psnr
+			block = False
+
+	def poll(self, block=False):
+		"""Returns (epoch, psnr, snapshot) of finished validations, in submission order"""
+		self.collect(block)
+
+		finished = []
+		while self.order and self.order[0] in self.done:
+			epoch = self.order.pop(0)
+			finished.append((epoch, self.done.pop(epoch), self.pending.pop(epoch)))
+		return finished
+
+	def close(self):
+		finished = []
+		while self.order:
+			finished += self.poll(block=True)
+
+		self.tasks.put(None)
+		self.process.join()
+		return finished
+
+	def terminate(self, timeout=10):
+		# stops the worker without validating the pending snapshots, a no-op after close()
+		if self.process.is_alive():
+			self.tasks.put(None)
+			self.process.join(timeout)
+		if self.process.is_alive():
+			self.process.terminate()
+			self.process.join()
+		self.tasks.cancel_join_thread()		# unsent snapshots must not block the exit
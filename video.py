@@ -0,0 +1,186 @@
+import os
+import argparse
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+import torch
+
+from utils import set_device, load_checkpoint
+from models import *
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', default='msrformer-s', type=str, help='model name')
+parser.add_argument('--save_dir', default='saved_models/', type=str, help='path to models saving')
+parser.add_argument('--exp', default='outdoor', type=str, help='experiment setting')
+parser.add_argument('--input', default='', type=str, help='input video file or camera index')
+parser.add_argument('--output', default='dehazed.mp4', type=str, help='output video file')
+parser.add_argument('--fourcc', default='mp4v', type=str, help='codec of the output video')
+parser.add_argument('--deploy', action='store_true', default=False, help='fuse DEConv branches before inference')
+parser.add_argument('--device', default='cuda', type=str, help='device used for inference (cuda or cpu)')
+parser.add_argument('--num_threads', default=0, type=int, help='intra-op threads on cpu, 0 for all cores')
+parser.add_argument('--amp_dtype', default='', type=str, help='run under autocast with this dtype (bfloat16 or float16)')
+parser.add_argument('--batch_size', default=4, type=int, help='frames per forward')
+parser.add_argument('--tile_size', default=0, type=int, help='tile size for tiled inference, 0 to disable')
+parser.add_argument('--queue_size', default=16, type=int, help='frames buffered between the stages')
+args = parser.parse_args()
+
+device = set_device(args.device, args.num_threads)
+amp_dtype = getattr(torch, args.amp_dtype) if args.amp_dtype else None
+
+
+class FrameReader(threading.Thread):
+	"""Decodes frames on its own thread, None marks the end of the stream"""
+	def __init__(self, capture, frames):
+		super().__init__(daemon=True)
+		self.capture = capture
+		self.frames = frames
+		self.stop = threading.Event()
+		self.error = None
+		self.elapsed = 0.
+		self.count = 0
+
+	def run(self):
+		try:
+			while not self.stop.is_set():
+				start = time.perf_counter()
+				ok, frame = self.capture.read()
+				if not ok:
+					break
+				self.elapsed += time.perf_counter() - start
+				self.count += 1
+				self.frames.put(frame)		# blocks while inference is behind
+		except Exception as e:
+			self.error = e
+		finally:
+			self.frames.put(None)
+
+
+class FrameWriter(threading.Thread):
+	"""Encodes frames on its own thread, None closes the writer"""
+	def __init__(self, writer, frames):
+		super().__init__(daemon=True)
+		self.writer = writer
+		self.frames = frames
+		self.error = None
+		self.elapsed = 0.
+		self.count = 0
+
+	def run(self):
+		while True:
+			frame = self.frames.get()
+			if frame is None:
+				break
+			if self.error is not None:		# drain the queue so the producer never blocks
+				continue
+			try:
+				start = time.perf_counter()
+				self.writer.write(frame)
+				self.elapsed += time.perf_counter() - start
+				self.count += 1
+			except Exception as e:
+				self.error = e
+
+
+def dehaze(network, frames):
+	# uint8 BGR frames are converted on the device, only uint8 crosses the bus both ways
+	x = torch.from_numpy(np.stack(frames)).to(device, non_blocking=True)
+	x = x.flip(3).permute(0, 3, 1, 2).float() / 255.0 * 2 - 1
+
+	with torch.no_grad():
+		with torch.autocast(device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
+			if args.tile_size > 0:
+				output = network.forward_tiled(x, args.tile_size)
+			else:
+				output = network(x)
+
+	output = (output.float().clamp_(-1, 1) * 0.5 + 0.5) * 255.0
+	output = output.round_().to(torch.uint8).permute(0, 2, 3, 1).flip(3)
+	return list(output.contiguous().cpu().numpy())
+
+
+if __name__ == '__main__':
+	network = eval(args.model.replace('-', '_'))()
+	network.to(device)
+	saved_model_dir = os.path.join(args.save_dir, args.exp, args.model+'.pth')
+
+	if os.path.exists(saved_model_dir):
+		print('==> Start dehazing, current model name: ' + args.model)
+		load_checkpoint(network, saved_model_dir)
+		if args.deploy:
+			network.switch_to_deploy()
+	else:
+		print('==> No existing trained model!')
+		exit(0)
+	network.eval()
+
+	capture = cv2.VideoCapture(int(args.input) if args.input.isdigit() else args.input)
+	if not capture.isOpened():
+		raise Exception("ERROR: cannot open " + args.input)
+
+	fps = capture.get(cv2.CAP_PROP_FPS) or 25
+	size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+	writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*args.fourcc), fps, size)
+
+	# bounded queues, a slow stage blocks the one before it instead of buffering the whole video
+	reader = FrameReader(capture, queue.Queue(args.queue_size))
+	encoder = FrameWriter(writer, queue.Queue(args.queue_size))
+	reader.start()
+	encoder.start()
+
+	infer_time, infer_wait, batches = 0., 0., 0
+	start = time.perf_counter()
+	done = False
+	try:
+		while not done:
+			wait_start = time.perf_counter()
+			frames = []
+			while len(frames) < args.batch_size:
+				frame = reader.frames.get()
+				if frame is None:
+					done = True
+					break
+				frames.append(frame)
+			infer_wait += time.perf_counter() - wait_start
+			if not frames:
+				break
+
+			infer_start = time.perf_counter()
+			outputs = dehaze(network, frames)		# the copy to cpu waits for the device
+			infer_time += time.perf_counter() - infer_start
+			batches += 1
+
+			for output in outputs:
+				encoder.frames.put(output)
+			if encoder.error is not None:
+				break
+	except KeyboardInterrupt:		# a camera never ends, the output is still closed properly
+		print('==> Interrupted, closing ' + args.output)
+
+	# VideoCapture is not thread-safe, the decoder must be done before the capture is released.
+	# Draining unblocks its put() until it has sent the sentinel and exited.
+	reader.stop.set()
+	while reader.is_alive() or not reader.frames.empty():
+		try:
+			reader.frames.get(timeout=0.1)
+		except queue.Empty:
+			pass
+	reader.join()
+
+	encoder.frames.put(None)
+	encoder.join()
+	elapsed = time.perf_counter() - start
+	capture.release()
+	writer.release()
+
+	for error in [reader.error, encoder.error]:
+		if error is not None:
+			raise error
+
+	frames = max(1, encoder.count)
+	print('==> {0} frames in {1:.02f} s, {2:.02f} frames/s'.format(encoder.count, elapsed, encoder.count / elapsed))
+	print('Decode: {0:.02f} ms/frame\tInfer: {1:.02f} ms/frame ({2} batches)\tEncode: {3:.02f} ms/frame\tWait for frames: {4:.02f} ms/frame'
+		  .format(reader.elapsed / max(1, reader.count) * 1000, infer_time / frames * 1000, batches,
+				  encoder.elapsed / frames * 1000, infer_wait / frames * 1000))